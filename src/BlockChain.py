@@ -34,16 +34,29 @@ These nodes will fully check the block to ensure a valid block is created by the
 from __future__ import annotations
 from enum import Enum
 from time import time
-from math import fsum, isclose
+import hashlib
 import secrets
+import struct
 from typing import NamedTuple
 from src.Signature import *
 from src.Transaction import *
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.backends import default_backend
-
-LEADING_ZEROES = 2
-NEXT_CHAR_LIMIT = 16
+from threading import Event
+from src.Mining import NONCE_SPACE, encode_nonce, encode_target, meets_target, next_nonce, ParallelMiner, MiningStats, MINING_WORKERS
+from src.Merkle import merkle_root, merkle_proof, verify_merkle_proof
+from src.BlockStore import body_store
+
+TARGET_MINING_TIME = 15  # seconds, the middle of the required 10 to 20 seconds
+RETARGET_WINDOW = 5  # blocks between two retargets
+MAX_RETARGET = 4  # largest factor the target may change by in one retarget
+MAX_TARGET = 2**256 - 1
+# about a million hashes per second on a single core, the first miner divides it by its worker count
+INITIAL_TARGET = MAX_TARGET // (TARGET_MINING_TIME * 2**20)
+MAX_CLOCK_DRIFT = 120  # seconds a timestamp may run ahead of the local clock
+# blocks mined before the binary header hash the string forms of their fields
+# and need leading zero bytes followed by a byte within a clock-widened limit
+LEGACY_VERSION = 0
+LEGACY_LEADING_ZEROES = 2
+BLOCK_VERSION = 1
 MATURITY_TIME = 180
 TX_MINIMUM = 5
 TX_MAXIMUM = 10
@@ -68,44 +81,199 @@ class BlockState(Enum):
 
 class ValidationFlag(NamedTuple):
     block_id: int
-    public_key: bytes
+    address: bytes
+    signature: bytes
+
+
+class ChainMark(NamedTuple):
+    height: int
+    tip_hash: bytes
+    signature: bytes
+
+
+class BlockHeader(NamedTuple):
+    id: int
+    previousHash: bytes
+    merkle_root: bytes
+    nonce: int
+    target: int
+    minted_at: float
+    mined_at: float
+    mined_by: bytes
+    hash: bytes
     signature: bytes
+    version: int = BLOCK_VERSION
+    # digest of the stored body, not part of the block hash since flags are added after mining
+    body_digest: bytes = None
+
+
+class BlockBody:
+    def __init__(self, txs: dict[str, Tx] = None, validation_flags: list[(bytes, bytes)] = None):
+        self.txs: dict[str, Tx] = txs if txs is not None else dict()
+        self.validation_flags: list[(bytes, bytes)] = validation_flags if validation_flags is not None else []
 
 
 class CBlock:
     def __init__(self, previousBlock: CBlock = None):
-        self.txs: dict[str, Tx] = dict()
+        self.__body = BlockBody()
         self.previousBlock = previousBlock
         self.previousHash = None if previousBlock is None else previousBlock.compute_hash()
-        self.next_char_limit = NEXT_CHAR_LIMIT
-        self.nonce = secrets.randbelow(2**256)
+        self.nonce = secrets.randbelow(NONCE_SPACE)
         self.hash = None
-        self.minted_at = time()
+        self.merkle_root = None
+        # a predecessor mined by a clock running ahead of ours must not be minted before
+        self.minted_at = time() if previousBlock is None or previousBlock.mined_at is None else max(time(), previousBlock.mined_at)
         self.mined_at = None
         self.mined_by = None
         self.signature = None
-        self.validation_flags: list[(bytes, bytes)] = []
         self.id = 0 if previousBlock is None else previousBlock.id + 1
+        self.version = BLOCK_VERSION
+        self.body_digest = None
+        self.target = self.expected_target()
+        self.watermark: ChainMark = None
+        self.__verified_header: tuple = None
+        self.__revision = 0
+        self.__state_cache: tuple[tuple, BlockState] = None
+
+    def __getstate__(self) -> dict:
+        # watermarks are only trusted for the lifetime of the process that verified them
+        state = self.__dict__.copy()
+        state['watermark'] = None
+        state['_CBlock__verified_header'] = None
+        state['_CBlock__state_cache'] = None
+        # a block that leaves the process always carries its body
+        state['_CBlock__body'] = self.__get_body()
+        # but not the chain below it, the receiving ledger links it by its previous hash
+        state['previousBlock'] = None
+        return state
+
+    def __setstate__(self, state: dict):
+        if 'version' not in state and 'next_char_limit' in state:
+            state = self.__legacy_state(state)
+        # blocks pickled before the state cache carry no revision
+        state.setdefault('watermark', None)
+        state.setdefault('_CBlock__verified_header', None)
+        state.setdefault('body_digest', None)
+        state.setdefault('_CBlock__revision', 0)
+        state.setdefault('_CBlock__state_cache', None)
+        self.__dict__.update(state)
+        if self.hash is None and self.version == LEGACY_VERSION:
+            # an unmined legacy block is mined as a current one
+            self.version = BLOCK_VERSION
+            self.nonce = secrets.randbelow(NONCE_SPACE)
+            self.target = self.expected_target()
+
+    @staticmethod
+    def __legacy_state(state: dict) -> dict:
+        # blocks pickled before the binary header carry their body inline, full PEM keys and a hash limit
+        txs = state.pop('txs')
+        flags = [(sig, address_of(pub)) for sig, pub in state.pop('validation_flags')]
+        state['_CBlock__body'] = BlockBody(txs, flags)
+        state['target'] = state.pop('next_char_limit')
+        state['version'] = LEGACY_VERSION
+        state['merkle_root'] = merkle_root([tx.hash for tx in txs.values()]) if state['hash'] is not None else None
+        state['mined_by'] = address_of(state['mined_by']) if state['mined_by'] is not None else None
+        return state
+
+    @staticmethod
+    def from_header(header: BlockHeader, previousBlock: CBlock = None, body: BlockBody = None) -> CBlock:
+        # rebuild a block from its header, without a body it is loaded from the block store on demand
+        block = CBlock(previousBlock)
+        (block.id, block.previousHash, block.merkle_root, block.nonce, block.target,
+         block.minted_at, block.mined_at, block.mined_by, block.hash, block.signature, block.version, block.body_digest) = header
+        block.__body = body
+        return block
+
+    def header(self) -> BlockHeader:
+        return BlockHeader(self.id, self.previousHash, self.merkle_root, self.nonce, self.target,
+                           self.minted_at, self.mined_at, self.mined_by, self.hash, self.signature, self.version,
+                           self.body_digest)
+
+    @property
+    def txs(self) -> dict[str, Tx]:
+        return self.__get_body().txs
+
+    @property
+    def validation_flags(self) -> list[(bytes, bytes)]:
+        return self.__get_body().validation_flags
+
+    @validation_flags.setter
+    def validation_flags(self, validation_flags: list[(bytes, bytes)]):
+        self.__get_body().validation_flags = validation_flags
+
+    def __get_body(self) -> BlockBody:
+        if self.__body is not None:
+            return self.__body
+        body = body_store.load(self.hash, self.body_digest)
+        # a missing or refused body leaves the block without txs, so it fails its merkle root check
+        return body if body is not None else BlockBody()
+
+    def __body_is_resident(self) -> bool:
+        return self.__body is not None or body_store.is_cached(self.hash)
+
+    def store_body(self):
+        # move the body of a mined block to the block store, only the header stays resident
+        if self.hash is not None and self.__body is not None:
+            self.body_digest = body_store.save(self.hash, self.__body)
+            self.__body = None
+
+    def __save_body(self):
+        # write back changes to a body that lives in the block store
+        if self.__body is None:
+            self.body_digest = body_store.save(self.hash, self.__get_body())
 
     def __repr__(self) -> str:
         return f"Block {self.id} [{self.state()}] : {self.hash.hex() if self.hash is not None else 'no hash yet'}"
 
+    def compute_merkle_root(self) -> bytes:
+        return merkle_root([tx.hash for tx in self.txs.values()])
+
+    def tx_proof(self, tx_hash: str) -> list[tuple[bytes, bool]] | None:
+        tx_hashes = list(self.txs.keys())
+        if tx_hash in tx_hashes:
+            return merkle_proof([tx.hash for tx in self.txs.values()], tx_hashes.index(tx_hash))
+        return None
+
+    @staticmethod
+    def verify_tx_proof(tx_hash: str, proof: list[tuple[bytes, bool]], root: bytes) -> bool:
+        return verify_merkle_proof(bytes.fromhex(tx_hash), proof, root)
+
+    def header_prefix(self) -> bytes:
+        # canonical binary layout of every header field except the nonce
+        mined_by = self.mined_by if self.mined_by is not None else b''
+        return b''.join((struct.pack('>Q', self.id),
+                         self.previousHash if self.previousHash is not None else bytes(32),
+                         self.merkle_root if self.merkle_root is not None else self.compute_merkle_root(),
+                         encode_target(self.target),
+                         struct.pack('>dd', self.minted_at,
+                                     self.mined_at if self.mined_at is not None else 0.0),
+                         struct.pack('>H', len(mined_by)),
+                         mined_by))
+
     def compute_hash(self) -> bytes:
-        digest = hashes.Hash(hashes.SHA256(), backend=default_backend())
-        digest.update(bytes(str(self.id), 'utf8'))
-        digest.update(bytes(str(self.txs), 'utf8'))
-        digest.update(bytes(str(self.previousHash), 'utf8'))
-        digest.update(bytes(str(self.nonce), 'utf8'))
-        digest.update(bytes(str(self.next_char_limit), 'utf8'))
-        digest.update(bytes(str(self.minted_at), 'utf8'))
-        digest.update(bytes(str(self.mined_at), 'utf8'))
-        digest.update(self.mined_by if self.mined_by is not None else bytes(
-            str("not mined yet"), 'utf8'))
-        return digest.finalize()
+        if self.version == LEGACY_VERSION:
+            # legacy blocks keep their original hash
+            return self.__compute_legacy_hash()
+        digest = hashlib.sha256(self.header_prefix())
+        digest.update(encode_nonce(self.nonce))
+        return digest.digest()
+
+    def __compute_legacy_hash(self) -> bytes:
+        # the string forms of the fields, the txs as their legacy repr and the full key of the miner
+        txs = '{' + ', '.join(f"{tx_hash!r}: {tx.legacy_repr()}" for tx_hash, tx in self.txs.items()) + '}'
+        digest = hashlib.sha256()
+        for field in (self.id, txs, self.previousHash, self.nonce, self.target, self.minted_at, self.mined_at):
+            digest.update(bytes(str(field), 'utf8'))
+        if self.mined_by is not None:
+            digest.update(key_directory.resolve(self.mined_by) or self.mined_by)
+        else:
+            digest.update(bytes("not mined yet", 'utf8'))
+        return digest.digest()
 
     def add_tx(self, tx: Tx) -> bool:
         if tx is not None and tx.is_valid() and self.state() <= BlockState.READY:
             self.txs.update({tx.hash.hex(): tx})
+            self.invalidate_state()
             return True
         return False
 
@@ -113,6 +281,7 @@ class CBlock:
         tx: Tx = self.txs.get(tx_hash)
         if tx is not None and tx.type != REWARD and tx.signed_by(sender_addr) and tx.sent_by(sender_addr):
             del self.txs[tx_hash]
+            self.invalidate_state()
             return True
         return False
 
@@ -122,65 +291,134 @@ class CBlock:
     def all_txs(self) -> dict[str, Tx]:
         return self.txs.copy()
 
-    def get_tx_fees(self) -> float:
-        return fsum(tx.fee for tx in self.txs.values())
+    def get_tx_fees(self) -> int:
+        return sum(tx.fee for tx in self.txs.values())
 
     def pop_tx_by_hash(self, tx_hash: str) -> Tx | None:
         if tx_hash in self.txs.keys():
+            self.invalidate_state()
             return self.txs.pop(tx_hash)
         return None
 
-    def get_txs_by_public_key(self, public_key: bytes) -> dict[str, Tx]:
-        return {tx_hash: tx for tx_hash, tx in self.txs.items() if tx.sender == public_key or tx.receiver == public_key}
+    def get_txs_by_address(self, address: bytes) -> dict[str, Tx]:
+        return {tx_hash: tx for tx_hash, tx in self.txs.items() if tx.sender == address or tx.receiver == address}
 
-    def __count_totals(self) -> tuple[float, float, float]:
-        return (fsum([tx.get_input() for tx in self.txs.values()]),
-                fsum([tx.get_output() for tx in self.txs.values()]),
-                fsum([tx.get_fee() for tx in self.txs.values()]))
+    def __count_totals(self) -> tuple[int, int, int]:
+        # exact sums of base units
+        return (sum(tx.get_input() for tx in self.txs.values()),
+                sum(tx.get_output() for tx in self.txs.values()),
+                sum(tx.get_fee() for tx in self.txs.values()))
 
     def __is_balanced(self) -> bool:
         total_in, total_out, fee = self.__count_totals()
-        return isclose(total_in, fsum((total_out, fee)))
+        return total_in == total_out + fee
 
     def __has_valid_txs(self) -> bool:
         return all(tx.is_valid() for tx in self.txs.values())
 
     def chain_is_valid(self) -> bool:
-        return self.__hash_is_valid() and (self.previousBlock is None or (self.previousHash == self.previousBlock.compute_hash() and self.previousBlock.chain_is_valid()))
+        # walk down the chain, every link is checked on each call
+        # but hashes and signatures are only verified again for blocks above their watermark
+        curr, computed = self, self.__trusted_hash()
+        while curr is not None:
+            if not curr.__hash_is_valid(computed):
+                return False
+            prev = curr.previousBlock
+            if prev is not None:
+                computed = prev.__trusted_hash()
+                if curr.previousHash != computed:
+                    return False
+            curr = prev
+        return True
+
+    def __below_watermark(self) -> bool:
+        # the header must be unchanged since it was verified, the body digest is not hashed
+        return self.watermark == (self.id, self.hash, self.signature) and self.__verified_header == self.header()[:-1]
+
+    def __trusted_hash(self) -> bytes:
+        return self.hash if self.__below_watermark() else self.compute_hash()
+
+    def __timestamps_are_plausible(self) -> bool:
+        # backdated or future timestamps would skew the mining times the next retarget observes
+        if self.version == LEGACY_VERSION:
+            return True
+        horizon = time() + MAX_CLOCK_DRIFT
+        if self.minted_at > horizon or (self.mined_at is not None and not self.minted_at <= self.mined_at <= horizon):
+            return False
+        prev = self.previousBlock
+        return prev is None or prev.mined_at is None or self.minted_at >= prev.mined_at
+
+    def __starts_difficulty(self) -> bool:
+        return self.id == 0 or (self.previousBlock is not None and self.previousBlock.version == LEGACY_VERSION)
 
-    def __hash_is_valid(self) -> bool:
-        return self.hash is None or self.hash == self.compute_hash() and self.good_nonce(self.hash) and verify(self.hash, self.signature, decode_public_key(self.mined_by))
+    def __target_is_valid(self) -> bool:
+        if self.version == LEGACY_VERSION:
+            return True
+        if self.__starts_difficulty():
+            # the first miner may pick a harder target for its workers, never an easier one
+            return 0 < self.target <= INITIAL_TARGET
+        return self.target == self.expected_target()
+
+    def __body_is_intact(self) -> bool:
+        # the leaves are the stored tx hashes, so every tx must still hash to its stored hash
+        return self.merkle_root == self.compute_merkle_root() and all(tx.hash_is_valid() for tx in self.txs.values())
+
+    def __hash_is_valid(self, computed: bytes = None) -> bool:
+        if not self.__timestamps_are_plausible():
+            return False
+        if self.hash is None:
+            return True
+        if (self.hash != (computed if computed is not None else self.compute_hash())
+                or (self.__body_is_resident() and not self.__body_is_intact())
+                or not self.__target_is_valid()
+                or not self.good_nonce(self.hash)):
+            return False
+        if not self.__below_watermark():
+            if not verify_by_address(self.hash, self.signature, self.mined_by):
+                return False
+            # record verified height, hash and signature
+            self.watermark = ChainMark(self.id, self.hash, self.signature)
+            self.__verified_header = self.header()[:-1]
+        return True
 
     def block_is_valid(self) -> bool:
-        return self.__hash_is_valid() and self.chain_is_valid() and self.__has_valid_txs() and self.__is_balanced()
+        return (self.chain_is_valid()
+                and (self.merkle_root is None or self.merkle_root == self.compute_merkle_root())
+                and self.__has_valid_txs()
+                and self.__is_balanced())
 
     def was_validated(self) -> bool:
-        # prune any invalid flags
-        self.validation_flags = [(sig, pub) for sig, pub in self.validation_flags
-                                 if verify(self.hash, sig, decode_public_key(pub))]
-        # A block is considered validated if it has at least 3 valid flags.
-        return len(self.validation_flags) >= REQUIRED_FLAGS and self.__hash_is_valid() and all(verify(self.hash, sig, decode_public_key(pub)) for sig, pub in self.validation_flags)
-
-    def was_validated_by(self, pub_key: rsa.RSAPublicKey) -> bool:
-        return any((verify(self.hash, sig, pub_key) and encode_public_key(pub_key) == pub) for sig, pub in self.validation_flags)
-
-    def get_validation_flag(self, pub_key: rsa.RSAPublicKey) -> ValidationFlag | None:
-        for sig, pub in self.validation_flags:
-            if verify(self.hash, sig, pub_key) and encode_public_key(pub_key) == pub:
-                return ValidationFlag(self.id, pub, sig)
+        # A block is considered validated if it has at least 3 valid flags, invalid flags are not counted
+        valid_flags = [(sig, addr) for sig, addr in self.validation_flags
+                       if verify_by_address(self.hash, sig, addr)]
+        return len(valid_flags) >= REQUIRED_FLAGS and self.__hash_is_valid()
+
+    def was_validated_by(self, pub_key: PublicKey) -> bool:
+        return self.get_validation_flag(pub_key) is not None
+
+    def get_validation_flag(self, pub_key: PublicKey) -> ValidationFlag | None:
+        address = address_of(pub_key)
+        for sig, addr in self.validation_flags:
+            if address_of(addr) == address and verify(self.hash, sig, pub_key):
+                return ValidationFlag(self.id, addr, sig)
         return None
 
-    def add_validation_flag(self, sig: bytes, pub: bytes) -> bool:
-        if self.hash is not None and verify(self.hash, sig, decode_public_key(pub)) and not self.was_validated_by(decode_public_key(pub)) and self.block_is_valid():
-            self.validation_flags.append((sig, pub))
+    def add_validation_flag(self, sig: bytes, addr: bytes) -> bool:
+        pub_key = resolve_public_key(addr)
+        if self.hash is not None and pub_key is not None and verify(self.hash, sig, pub_key) and not self.was_validated_by(pub_key) and self.block_is_valid():
+            self.validation_flags.append((sig, address_of(addr)))
+            self.__save_body()
+            self.invalidate_state()
             return True
         return False
 
-    def validate_block(self, priv_key: rsa.RSAPrivateKey, pub_key: rsa.RSAPublicKey) -> bool:
+    def validate_block(self, priv_key: PrivateKey, pub_key: PublicKey) -> bool:
         if self.hash is not None and not self.was_validated_by(pub_key) and self.block_is_valid():
             signature = sign(self.hash, priv_key)
             self.validation_flags.append((signature,
-                                          encode_public_key(pub_key)))
+                                          address_of(pub_key)))
+            self.__save_body()
+            self.invalidate_state()
             return True
         return False
 
@@ -189,34 +427,95 @@ class CBlock:
                                                                    or time() - self.previousBlock.mined_at >= MATURITY_TIME
                                                                    and self.previousBlock.was_validated()) and self.block_is_valid()
 
-    def mine(self, priv_key: rsa.RSAPrivateKey, pub_key: rsa.RSAPublicKey) -> CBlock:
+    def mine(self, priv_key: PrivateKey, pub_key: PublicKey, workers: int = 1, cancel: Event = None, stats: MiningStats = None) -> CBlock:
         # check mining conditions
         if not self.__ready_to_mine():
             return self  # return current block if conditions are not met
 
-        self.mined_by = encode_public_key(pub_key)  # save miner
-        self.mined_at = time()  # timestamp
-        hash_candidate = self.compute_hash()  # get initial hash candidate
-        start = time()  # set timer
-
-        # do until hash is sufficiently complex
-        while not self.good_nonce(hash_candidate):
-            self.nonce = secrets.randbelow(2**256)  # generate new nonce
-            self.mined_at = time()  # timestamp
-            hash_candidate = self.compute_hash()  # get new hash candidate
-            if time() - start > 2:
-                # expand valid hashpool every 2 seconds
-                self.next_char_limit += NEXT_CHAR_LIMIT
-                start = time()  # reset timer
-
-        self.hash = hash_candidate  # save final hash
+        self.mined_by = address_of(pub_key)  # save miner
+        self.mined_at = max(time(), self.minted_at)  # timestamp, never before minting
+        self.merkle_root = self.compute_merkle_root()  # commit txs
+        if self.__starts_difficulty():
+            # the initial target is tuned for a single worker
+            self.target = max(1, INITIAL_TARGET // workers)
+        prefix = self.header_prefix()  # serialize header once
+        nonce = self.nonce  # count up from the initial nonce
+        found = None
+
+        with ParallelMiner(workers, cancel, stats) as miner:
+            miner.stats.start(self.difficulty(), workers)
+            # do until hash is sufficiently complex, checking the stop token between batches
+            while not miner.cancel.is_set():
+                if (found := miner.search(prefix, self.target, nonce)) is not None:
+                    break
+                nonce = next_nonce(nonce, miner.batch_size())
+            miner.stats.stop()
+
+        if found is None:
+            # abandon the attempt and leave the block ready to mine
+            self.mined_by = self.mined_at = self.merkle_root = None
+            self.invalidate_state()
+            return self
+
+        self.nonce = found  # save winning nonce
+        self.hash = self.compute_hash()  # save final hash
         self.signature = sign(self.hash, priv_key)  # sign block
+        self.invalidate_state()
         return CBlock(self)  # return new block
 
     def good_nonce(self, hash_candidate: bytes) -> bool:
-        return hash_candidate.startswith(b'0' * LEADING_ZEROES) and hash_candidate[LEADING_ZEROES] <= self.next_char_limit
+        if self.version == LEGACY_VERSION:
+            return (hash_candidate.startswith(b'0' * LEGACY_LEADING_ZEROES)
+                    and hash_candidate[LEGACY_LEADING_ZEROES] <= self.target)
+        return meets_target(hash_candidate, self.target)
+
+    def expected_target(self) -> int:
+        # the target follows from the headers below this block, so every node can verify it
+        if self.previousBlock is None or self.previousBlock.version == LEGACY_VERSION:
+            # legacy blocks have a hash limit instead of a target
+            return INITIAL_TARGET
+        if self.id % RETARGET_WINDOW != 0:
+            return self.previousBlock.target
+
+        # a block is found when its successor is minted, which gives the observed mining times
+        durations = []
+        successor, curr = self, self.previousBlock
+        while curr is not None and len(durations) < RETARGET_WINDOW:
+            if curr.mined_at is not None:
+                durations.append(max(1, round((successor.minted_at - curr.mined_at) * 1000)))
+            successor, curr = curr, curr.previousBlock
+        if len(durations) == 0:
+            return self.previousBlock.target
+
+        observed = sum(durations) // len(durations)
+        expected = TARGET_MINING_TIME * 1000
+        observed = min(max(observed, expected // MAX_RETARGET), expected * MAX_RETARGET)
+        return min(self.previousBlock.target * observed // expected, MAX_TARGET)
+
+    def difficulty(self) -> int:
+        # expected number of hash attempts to find a good nonce
+        return MAX_TARGET // self.target
+
+    def invalidate_state(self):
+        self.__revision += 1
+
+    def __state_key(self) -> tuple:
+        # everything the state depends on, the clock only matters until the maturity boundary is passed
+        matured = prev_key = None
+        if self.hash is None and self.previousBlock is not None:
+            matured = (self.previousBlock.mined_at is not None
+                       and time() - self.previousBlock.mined_at >= MATURITY_TIME)
+            prev_key = self.previousBlock.__state_key()
+        return (self.__revision, len(self.txs), self.hash, self.signature, len(self.validation_flags), matured, prev_key)
 
     def state(self) -> BlockState:
+        key = self.__state_key()
+        if self.__state_cache is None or self.__state_cache[0] != key:
+            state = self.__compute_state()
+            self.__state_cache = (self.__state_key(), state)
+        return self.__state_cache[1]
+
+    def __compute_state(self) -> BlockState:
         if self.hash is None and not self.__ready_to_mine():
             return BlockState.NEW
         elif self.__ready_to_mine():
@@ -225,3 +524,25 @@ class CBlock:
             return BlockState.MINED
         elif self.was_validated():
             return BlockState.VALIDATED
+
+
+class MiningJob:
+    # a single attempt at mining a block, which can be stopped from another thread
+    def __init__(self, block: CBlock, workers: int = MINING_WORKERS, stats: MiningStats = None):
+        self.block = block
+        self.workers = workers
+        self.stats = stats if stats is not None else MiningStats()
+        self.stop_token = Event()
+        self.result: CBlock = None
+
+    def run(self, priv_key: PrivateKey, pub_key: PublicKey) -> CBlock | None:
+        # returns the new block built on the mined block, or None if the job was cancelled
+        new = self.block.mine(priv_key, pub_key, self.workers, self.stop_token, self.stats)
+        self.result = new if new is not self.block else None
+        return self.result
+
+    def cancel(self):
+        self.stop_token.set()
+
+    def is_cancelled(self) -> bool:
+        return self.stop_token.is_set() and self.result is None
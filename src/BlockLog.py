@@ -0,0 +1,360 @@
+"""
+The BlockLog module keeps the ledger on disk as an append-only log for the GoodChain project.
+
+Records are appended to numbered segment files and never rewritten.
+A mined block is appended once as a block record, the mutable head block is journaled as a head record
+whenever it changes. When flags change the body of a mined block, its header is appended again as a body
+record with the new body digest. Replaying the records in order rebuilds the chain.
+
+A manifest records the size and SHA-256 checksum of every segment. The root hash over the manifest
+changes with every append and is what the node stores to detect tampering, like the old file hash.
+Loading only compares the manifest against the stored root, a segment is checked against its checksum
+the first time it is read and is not hashed again until its file changes. Block bodies live outside the
+log and are checked against the body digest in their logged header when they are loaded.
+
+A fixed width index maps every height to the location of its block record, and its first slot to the
+latest head record, so the chain is loaded without decoding the journaled head records. The index checksum
+is part of the manifest and the root. An index that does not match it is rebuilt from the verified segments.
+"""
+
+from __future__ import annotations
+import hashlib
+import mmap
+import os
+import pickle
+import struct
+import threading
+from pathlib import Path
+from typing import Iterator, NamedTuple
+from src.BlockStore import compose_relative_filepath
+
+SEGMENT_SIZE = 4 * 1024 * 1024  # a new segment is started once the last one passes this size
+RECORD_LENGTH = struct.Struct('>I')
+# segment number, offset and length of a record and the hash of its block
+INDEX_ENTRY = struct.Struct('>IQI32s')
+HEAD_SLOT = 0  # slot of the latest head record, block records follow at their height + 1
+
+BLOCK_RECORD = 0  # (BLOCK_RECORD, header, index entry) of a mined block
+HEAD_RECORD = 1  # (HEAD_RECORD, header, body) of the head block
+BODY_RECORD = 2  # (BODY_RECORD, header, index entry) of a logged block whose body changed, keeps the blocks above it
+
+
+class SegmentInfo(NamedTuple):
+    name: str
+    size: int
+    checksum: bytes
+
+
+class Manifest(NamedTuple):
+    segments: list[SegmentInfo]
+    # checksum of the index, None while the log is empty
+    index_checksum: bytes | None
+
+
+class IndexEntry(NamedTuple):
+    segment: int
+    offset: int
+    length: int
+    block_hash: bytes
+
+
+def encode_record(record: tuple) -> bytes:
+    data = pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+    return RECORD_LENGTH.pack(len(data)) + data
+
+
+def iter_records(data: bytes) -> Iterator[tuple[int, int, tuple]]:
+    # offset and length of the pickled data of every record, with the record
+    offset = 0
+    while offset < len(data):
+        (length,) = RECORD_LENGTH.unpack_from(data, offset)
+        offset += RECORD_LENGTH.size
+        yield offset, length, pickle.loads(data[offset:offset + length])
+        offset += length
+
+
+def decode_records(data: bytes) -> list[tuple]:
+    return [record for _, _, record in iter_records(data)]
+
+
+def index_record(index: bytearray, record: tuple, segment: int, offset: int, length: int):
+    # a block record replaces the slot of its height and drops every slot above it, a body record only its slot
+    header = record[1]
+    slot = HEAD_SLOT if record[0] == HEAD_RECORD else header.id + 1
+    if record[0] == BLOCK_RECORD:
+        del index[slot * INDEX_ENTRY.size:]
+    if len(index) < (slot + 1) * INDEX_ENTRY.size:
+        index.extend(bytes((slot + 1) * INDEX_ENTRY.size - len(index)))
+    INDEX_ENTRY.pack_into(index, slot * INDEX_ENTRY.size, segment, offset, length,
+                          header.hash if header.hash is not None else bytes(32))
+
+
+class BlockLog:
+    def __init__(self, directory: Path, segment_size: int = SEGMENT_SIZE):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.segments: list[SegmentInfo] = []
+        self.index_checksum: bytes | None = None
+        # running checksum of the last segment, so appends never re-read it
+        self.digest = None
+        # segment name to the checksum, size and mtime it was last verified with
+        self.verified: dict[str, tuple[bytes, int, int]] = dict()
+        # the verified index with the checksum, size and mtime it was verified with
+        self.index: tuple[tuple, bytearray] | None = None
+        self.lock = threading.Lock()
+
+    def manifest_path(self) -> Path:
+        return self.directory / "manifest.dat"
+
+    def segment_path(self, name: str) -> Path:
+        return self.directory / name
+
+    def index_path(self) -> Path:
+        return self.directory / "index.dat"
+
+    @staticmethod
+    def root_of(segments: list[SegmentInfo], index_checksum: bytes = None) -> bytes:
+        digest = hashlib.sha256()
+        for segment in segments:
+            digest.update(bytes(segment.name, 'utf8'))
+            digest.update(segment.size.to_bytes(8, 'big'))
+            digest.update(segment.checksum)
+        if index_checksum is not None:
+            digest.update(index_checksum)
+        return digest.digest()
+
+    def root(self) -> bytes:
+        with self.lock:
+            return self.root_of(self.__get_segments(), self.index_checksum)
+
+    def append(self, records: list[tuple]) -> bytes:
+        # append records to the last segment and return the new root hash
+        with self.lock:
+            segments = self.__get_segments()
+            if len(records) == 0:
+                return self.root_of(segments, self.index_checksum)
+            # a tampered index is rebuilt before it is extended
+            if (index := self.__verified_index(segments)) is None:
+                raise ValueError("Block log index can not be rebuilt from its segments")
+            encoded = [encode_record(record) for record in records]
+            data = b''.join(encoded)
+
+            if len(segments) == 0 or segments[-1].size >= self.segment_size:
+                segments.append(SegmentInfo(f"segment-{len(segments):05}.log", 0, hashlib.sha256().digest()))
+                self.digest = hashlib.sha256()
+            elif self.digest is None or self.digest.digest() != segments[-1].checksum or not self.__is_verified(segments[-1]):
+                if (content := self.__verified_content(segments[-1])) is None:
+                    raise ValueError(f"Segment {segments[-1].name} does not match its checksum")
+                self.digest = hashlib.sha256(content)
+
+            self.directory.mkdir(parents=True, exist_ok=True)
+            path = self.segment_path(segments[-1].name)
+            with open(path, "r+b" if path.exists() else "wb") as f:
+                # drop anything past the manifest, left behind by an interrupted append
+                f.seek(segments[-1].size)
+                f.truncate()
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            self.digest.update(data)
+            offset = segments[-1].size
+            segments[-1] = SegmentInfo(segments[-1].name, segments[-1].size + len(data), self.digest.digest())
+            self.__mark_verified(segments[-1])
+            # the index goes first, an index ahead of the manifest does not match its checksum and is rebuilt
+            self.__write_index(index, records, encoded, len(segments) - 1, offset)
+            self.__write_manifest(segments, self.index_checksum)
+            return self.root_of(segments, self.index_checksum)
+
+    def read(self, root: bytes) -> list[tuple] | None:
+        # all records in order, or None if the log does not match the root hash
+        with self.lock:
+            if (contents := self.__read_verified(root)) is None:
+                return None
+            return [record for data in contents for record in decode_records(data)]
+
+    def matches(self, root: bytes) -> bool:
+        # only the manifest is compared, segments and the index are verified when they are read
+        with self.lock:
+            return root is not None and self.root_of(self.__get_segments(), self.index_checksum) == root
+
+    def verify(self, root: bytes) -> bool:
+        with self.lock:
+            segments = self.__get_segments()
+            return (root is not None and self.root_of(segments, self.index_checksum) == root
+                    and all(self.__is_verified(segment) for segment in segments)
+                    and self.__verified_index(segments) is not None)
+
+    def indexed_records(self) -> tuple[list[tuple], tuple | None] | None:
+        # the block records and the latest head record, without decoding any journaled head records
+        with self.lock:
+            segments = self.__get_segments()
+            index = self.__verified_index(segments)
+            if index is None or len(index) == 0:
+                return None
+            entries = [IndexEntry(*entry) for entry in INDEX_ENTRY.iter_unpack(index)]
+            # every segment is verified and mapped once for all records in it
+            files: dict[int, tuple | None] = dict()
+            try:
+                records = [self.__record_at(entry, segments, files) for entry in entries]
+            finally:
+                for mapped in files.values():
+                    if mapped is not None:
+                        mapped[1].close()
+                        mapped[0].close()
+            blocks = records[HEAD_SLOT + 1:]
+            if any(record is None for record in blocks) or (records[HEAD_SLOT] is None and entries[HEAD_SLOT].length > 0):
+                return None
+            return blocks, records[HEAD_SLOT]
+
+    def reset(self):
+        with self.lock:
+            for segment in self.__get_segments():
+                self.segment_path(segment.name).unlink(missing_ok=True)
+            self.index_path().unlink(missing_ok=True)
+            self.segments = []
+            self.index_checksum = None
+            self.index = None
+            self.digest = None
+            self.verified.clear()
+            self.__write_manifest(self.segments, self.index_checksum)
+
+    def __get_segments(self) -> list[SegmentInfo]:
+        # the manifest is small, it is read again in case another log object appended
+        try:
+            with open(self.manifest_path(), "rb") as f:
+                self.segments, self.index_checksum = pickle.load(f)
+        except Exception:
+            self.segments, self.index_checksum = [], None
+        return self.segments
+
+    def __read_verified(self, root: bytes) -> list[bytes] | None:
+        segments = self.__get_segments()
+        if root is None or self.root_of(segments, self.index_checksum) != root:
+            return None
+        contents = []
+        for segment in segments:
+            if (data := self.__verified_content(segment)) is None:
+                return None
+            contents.append(data)
+        return contents
+
+    def __stamp(self, segment: SegmentInfo) -> tuple[bytes, int, int] | None:
+        try:
+            return segment.checksum, segment.size, self.segment_path(segment.name).stat().st_mtime_ns
+        except OSError:
+            return None
+
+    def __mark_verified(self, segment: SegmentInfo):
+        self.verified[segment.name] = self.__stamp(segment)
+
+    def __verified_content(self, segment: SegmentInfo) -> bytes | None:
+        # the segment contents if they match the manifest checksum
+        data = self.__read_segment(segment)
+        if len(data) != segment.size or hashlib.sha256(data).digest() != segment.checksum:
+            self.verified.pop(segment.name, None)
+            return None
+        self.__mark_verified(segment)
+        return data
+
+    def __is_verified(self, segment: SegmentInfo) -> bool:
+        # a segment is hashed again only when its checksum or file changed since it was verified
+        stamp = self.__stamp(segment)
+        if stamp is not None and self.verified.get(segment.name) == stamp:
+            return True
+        return self.__verified_content(segment) is not None
+
+    def __read_segment(self, segment: SegmentInfo) -> bytes:
+        try:
+            with open(self.segment_path(segment.name), "rb") as f:
+                return f.read(segment.size)
+        except OSError:
+            return b''
+
+    def __write_manifest(self, segments: list[SegmentInfo], index_checksum: bytes | None):
+        # replace the manifest in one step, so a crash never leaves half of it
+        self.directory.mkdir(parents=True, exist_ok=True)
+        temp = self.manifest_path().with_suffix(".tmp")
+        with open(temp, "wb+") as f:
+            pickle.dump(Manifest(segments, index_checksum), f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp, self.manifest_path())
+
+    def __index_stamp(self) -> tuple | None:
+        try:
+            stat = self.index_path().stat()
+            return self.index_checksum, stat.st_size, stat.st_mtime_ns
+        except OSError:
+            return None
+
+    def __verified_index(self, segments: list[SegmentInfo]) -> bytearray | None:
+        # the index if it matches the manifest checksum, otherwise it is rebuilt from the verified segments
+        stamp = self.__index_stamp()
+        if self.index is not None and stamp is not None and self.index[0] == stamp:
+            return self.index[1]
+        try:
+            index = bytearray(self.index_path().read_bytes())
+        except OSError:
+            index = None
+        if index is None or self.index_checksum is None or hashlib.sha256(index).digest() != self.index_checksum:
+            if (index := self.__rebuild_index(segments)) is None:
+                return None
+        self.index = (self.__index_stamp(), index)
+        return index
+
+    def __rebuild_index(self, segments: list[SegmentInfo]) -> bytearray | None:
+        index = bytearray()
+        for number, segment in enumerate(segments):
+            if (data := self.__verified_content(segment)) is None:
+                return None
+            for offset, length, record in iter_records(data):
+                index_record(index, record, number, offset, length)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        temp = self.index_path().with_suffix(".tmp")
+        with open(temp, "wb+") as f:
+            f.write(index)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp, self.index_path())
+        return index
+
+    def __write_index(self, index: bytearray, records: list[tuple], encoded: list[bytes], segment: int, offset: int):
+        # only the slots that changed are written
+        slots = set()
+        for record, data in zip(records, encoded):
+            index_record(index, record, segment, offset + RECORD_LENGTH.size, len(data) - RECORD_LENGTH.size)
+            slots.add(HEAD_SLOT if record[0] == HEAD_RECORD else record[1].id + 1)
+            offset += len(data)
+        with open(self.index_path(), "r+b" if self.index_path().exists() else "wb") as f:
+            f.truncate(len(index))
+            for slot in sorted(slots):
+                if slot * INDEX_ENTRY.size < len(index):
+                    f.seek(slot * INDEX_ENTRY.size)
+                    f.write(index[slot * INDEX_ENTRY.size:(slot + 1) * INDEX_ENTRY.size])
+            f.flush()
+            os.fsync(f.fileno())
+        self.index_checksum = hashlib.sha256(index).digest()
+        self.index = (self.__index_stamp(), index)
+
+    def __record_at(self, entry: IndexEntry, segments: list[SegmentInfo], files: dict[int, tuple | None]) -> tuple | None:
+        if entry.length == 0 or entry.segment >= len(segments) or entry.offset + entry.length > segments[entry.segment].size:
+            return None
+        if entry.segment not in files:
+            segment = segments[entry.segment]
+            files[entry.segment] = None
+            if self.__is_verified(segment):
+                f = open(self.segment_path(segment.name), "rb")
+                files[entry.segment] = (f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        if (mapped := files[entry.segment]) is None:
+            return None
+        try:
+            record = pickle.loads(mapped[1][entry.offset:entry.offset + entry.length])
+        except Exception:
+            return None
+        # an entry that does not point at the block it names is not used
+        if record[1].hash != (entry.block_hash if entry.block_hash != bytes(32) else None):
+            return None
+        return record
+
+
+block_log = BlockLog(compose_relative_filepath("ledger"))
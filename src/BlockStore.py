@@ -0,0 +1,94 @@
+"""
+The BlockStore module keeps the bodies of mined blocks on disk for the GoodChain project.
+
+Only block headers stay resident in the ledger. The body of a block (its txs and validation flags)
+is written to the store once the block is mined, and loaded again on demand by its block hash.
+A bounded LRU keeps the bodies that are used the most in memory.
+
+Saving a body returns the SHA-256 digest of the stored bytes. The block keeps it in its header, which is
+logged, and a body is only loaded if it still matches that digest. Every version of a body is written to its
+own file named by that digest, so the version the log names stays on disk until a newer one is logged.
+"""
+
+from __future__ import annotations
+import hashlib
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+BODY_CACHE_SIZE = 64
+DATA_DIRECTORY = Path(__file__).parent / "../data"
+
+
+def compose_relative_filepath(filename: str) -> Path:
+    file_path = (DATA_DIRECTORY / filename).resolve()
+    return file_path
+
+
+class BodyStore:
+    def __init__(self, directory: Path, maxsize: int = BODY_CACHE_SIZE):
+        self.directory = directory
+        self.maxsize = maxsize
+        # block hash to the digest and the body
+        self.bodies: OrderedDict[bytes, tuple[bytes, object]] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def path(self, block_hash: bytes, digest: bytes) -> Path:
+        return self.directory / f"{block_hash.hex()}-{digest.hex()}.dat"
+
+    def save(self, block_hash: bytes, body: object) -> bytes:
+        # returns the digest of the stored body, an existing version is never overwritten
+        content = pickle.dumps(body, protocol=pickle.HIGHEST_PROTOCOL)
+        digest = hashlib.sha256(content).digest()
+        path = self.path(block_hash, digest)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with self.lock:
+            if not path.exists():
+                temp = path.with_suffix(".tmp")
+                with open(temp, "wb+") as f:
+                    f.write(content)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temp, path)
+            self.__cache(block_hash, digest, body)
+        return digest
+
+    def load(self, block_hash: bytes, digest: bytes | None) -> object | None:
+        # the version of the body with the digest, a file that does not match it is refused
+        if digest is None:
+            return None
+        with self.lock:
+            if block_hash in self.bodies and self.bodies[block_hash][0] == digest:
+                self.bodies.move_to_end(block_hash)
+                return self.bodies[block_hash][1]
+            try:
+                with open(self.path(block_hash, digest), "rb") as f:
+                    content = f.read()
+                if hashlib.sha256(content).digest() != digest:
+                    raise ValueError("the body does not match the digest in its header")
+                body = pickle.loads(content)
+            except Exception as e:
+                print(f"Loading block body {block_hash.hex()} failed with error:\n{e}")
+                return None
+            self.__cache(block_hash, digest, body)
+            return body
+
+    def remove(self, block_hash: bytes, digest: bytes):
+        # drop a version that is no longer named by the log
+        with self.lock:
+            self.path(block_hash, digest).unlink(missing_ok=True)
+
+    def is_cached(self, block_hash: bytes) -> bool:
+        with self.lock:
+            return block_hash in self.bodies
+
+    def __cache(self, block_hash: bytes, digest: bytes, body: object):
+        self.bodies[block_hash] = (digest, body)
+        self.bodies.move_to_end(block_hash)
+        while len(self.bodies) > self.maxsize:
+            self.bodies.popitem(last=False)
+
+
+body_store = BodyStore(compose_relative_filepath("blocks"))
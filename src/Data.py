@@ -21,7 +21,9 @@ The purpose of each file is briefly described below:
         As at any specific time, only one user can access the file, it is not needed (and not allowed) to have a separate copy of files for each node.
 """
 from __future__ import annotations
+import hashlib
 import pickle
+import sqlite3
 from pathlib import Path
 import threading
 from typing import Mapping
@@ -30,21 +32,22 @@ from cryptography.hazmat.backends import default_backend
 from src.Transaction import *
 from src.BlockChain import *
 from src.User import User
+from src.BlockStore import compose_relative_filepath, body_store
+from src.BlockLog import block_log, BLOCK_RECORD, HEAD_RECORD, BODY_RECORD, encode_record
+from src.PoolLog import pool_log, ADD_RECORD, REMOVE_RECORD
+from src.LedgerIndex import LedgerIndex, TxLocation
 
 
-def compose_relative_filepath(filename: str) -> Path:
-    base_path = Path(__file__).parent
-    file_path = (base_path / f"../data/{filename}").resolve()
-    return file_path
+def content_hash(content: bytes) -> bytes:
+    digest = hashes.Hash(hashes.SHA256(), backend=default_backend())
+    digest.update(content)
+    return digest.finalize()
 
 
 def file_hash(path: Path) -> bytes | None:
-    digest = hashes.Hash(hashes.SHA256(), backend=default_backend())
     try:
         with open(path, "rb") as f:
-            content = f.read()
-            digest.update(content)
-            return digest.finalize()
+            return content_hash(f.read())
     except:
         return None
 
@@ -54,62 +57,136 @@ def compare_hash(path: Path, hash: bytes) -> bool:
 
 
 def save_and_return_hash(file: str, data: object) -> bytes | None:
+    # the hash is taken from the bytes being written, the file is not read back
     path = compose_relative_filepath(file)
+    content = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
     with open(path, "wb+") as f:
-        pickle.dump(data, f,  protocol=pickle.HIGHEST_PROTOCOL)
-    return file_hash(path)
+        f.write(content)
+    return content_hash(content)
 
 
 def load_if_valid(file: str, hash: bytes) -> object | None:
+    # the file is read once, its hash is checked before the same bytes are unpickled
     try:
         path = compose_relative_filepath(file)
-        if compare_hash(path, hash):
-            with open(path, "rb") as f:
-                return pickle.load(f)
+        with open(path, "rb") as f:
+            content = f.read()
+        if content_hash(content) == hash:
+            return pickle.loads(content)
     except Exception as e:
         return None
 
 
 account_mutex = threading.Lock()
 
+# usernames, public keys and addresses are unique, each has its own index
+ACCOUNTS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    password BLOB NOT NULL,
+    private_key BLOB NOT NULL,
+    public_key BLOB NOT NULL UNIQUE,
+    address BLOB NOT NULL UNIQUE
+)
+"""
+USER_COLUMNS = "username, password, private_key, public_key"
 
-class Accounts:
-    def __init__(self):
-        self.users: dict[str, User] = dict()
 
-    def add_user(self, user: User) -> bool:
-        if not user.username in self.users.keys():
-            account_mutex.acquire()
-            self.users.update({user.username: user})
-            account_mutex.release()
-            return True
-        return False
+def chain_user_hash(digest: bytes, row: tuple) -> bytes:
+    # the accounts hash chains every user in the order they were added
+    chained = hashlib.sha256(digest)
+    for field in row:
+        field = bytes(field, 'utf8') if isinstance(field, str) else field
+        chained.update(len(field).to_bytes(4, 'big'))
+        chained.update(field)
+    return chained.digest()
 
-    def get_user(self, username: str) -> User:
-        return self.users.get(username)
 
-    def get_user_directory(self) -> dict[str, bytes]:
-        return self.users.copy()
+class Accounts:
+    def __init__(self, path: Path = None):
+        self.path = path if path is not None else compose_relative_filepath("database.db")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # statements are parameterized, so sqlite prepares each of them once per connection
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        with account_mutex, self.connection:
+            self.connection.execute(ACCOUNTS_SCHEMA)
+            self.acc_hash = self.__hash_users()
+
+    def __setstate__(self, state: dict):
+        # accounts stored before the database are a pickled dict of users, which load moves into the database
+        self.__dict__.update(state)
 
-    def get_user_by_public_key(self, public_key: bytes) -> User | None:
-        for user in self.users.values():
-            if user.public_key == public_key:
-                return user
-        return None
+    def add_user(self, user: User) -> bool:
+        row = (user.username, user.password, user.private_key, user.public_key)
+        with account_mutex:
+            try:
+                with self.connection:
+                    self.connection.execute(f"INSERT INTO users ({USER_COLUMNS}, address) VALUES (?, ?, ?, ?, ?)",
+                                            (*row, user.get_address()))
+            except sqlite3.IntegrityError:
+                # the username or key is already registered
+                return False
+            self.acc_hash = chain_user_hash(self.acc_hash, row)
+        return True
+
+    def get_user(self, username: str) -> User | None:
+        return self.__query_user("username", username)
+
+    def get_user_directory(self) -> dict[str, User]:
+        with account_mutex:
+            rows = self.connection.execute(f"SELECT {USER_COLUMNS} FROM users ORDER BY rowid").fetchall()
+        return {row[0]: User.from_record(*row) for row in rows}
+
+    def get_user_by_address(self, address: bytes) -> User | None:
+        return self.__query_user("address", address)
 
     def user_exists(self, username: str) -> bool:
-        return username in self.users.keys()
+        with account_mutex:
+            return self.connection.execute("SELECT 1 FROM users WHERE username = ?", (username,)).fetchone() is not None
+
+    def user_count(self) -> int:
+        with account_mutex:
+            return self.connection.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+    def usernames(self) -> list[str]:
+        with account_mutex:
+            return [row[0] for row in self.connection.execute("SELECT username FROM users")]
+
+    def reset(self, users: list[User]):
+        # replace every stored user
+        with account_mutex, self.connection:
+            self.connection.execute("DELETE FROM users")
+            self.connection.executemany(f"INSERT INTO users ({USER_COLUMNS}, address) VALUES (?, ?, ?, ?, ?)",
+                                        [(user.username, user.password, user.private_key, user.public_key,
+                                          user.get_address()) for user in users])
+            self.acc_hash = self.__hash_users()
 
     def save(self) -> bytes | None:
-        account_mutex.acquire()
-        result = save_and_return_hash("database.dat", self)
-        account_mutex.release()
-        return result
+        # users are committed as they are added, so only the hash is returned
+        with account_mutex:
+            return self.acc_hash
+
+    def __query_user(self, column: str, value) -> User | None:
+        with account_mutex:
+            row = self.connection.execute(f"SELECT {USER_COLUMNS} FROM users WHERE {column} = ?", (value,)).fetchone()
+        return User.from_record(*row) if row is not None else None
+
+    def __hash_users(self) -> bytes:
+        acc_hash = hashlib.sha256().digest()
+        for row in self.connection.execute(f"SELECT {USER_COLUMNS} FROM users ORDER BY rowid"):
+            acc_hash = chain_user_hash(acc_hash, row)
+            # fill the key directory, so addresses of known users resolve to their keys
+            address_of(row[3])
+        return acc_hash
 
     @staticmethod
     def load(acc_hash: bytes) -> Accounts:
-        accounts: Accounts = load_if_valid("database.dat", acc_hash)
-        return accounts if accounts is not None else Accounts()
+        accounts = Accounts()
+        if accounts.acc_hash != acc_hash:
+            # the database does not match the stored hash, it is replaced by the legacy accounts or emptied
+            legacy: Accounts = load_if_valid("database.dat", acc_hash)
+            accounts.reset(list(legacy.users.values()) if legacy is not None else [])
+        return accounts
 
 
 ledger_mutex = threading.Lock()
@@ -117,12 +194,102 @@ ledger_mutex = threading.Lock()
 
 class Ledger:
     def __init__(self):
-        self.head: CBlock = None
+        # every block of the chain by its height, the last one is the head, and mined blocks by their hash
+        self.blocks: list[CBlock] = []
+        self.heights: dict[bytes, int] = dict()
+        # txs and miners of the blocks below the head
+        self.index = LedgerIndex()
+        self.__init_log_state()
+
+    def __init_log_state(self, log_root: bytes = None):
+        # what this ledger last wrote to the block log, so a save only appends the changes
+        self.log_root = log_root
+        self.logged_hashes: list[bytes] = []
+        self.logged_digests: list[bytes] = []
+        self.logged_head: bytes = None
+
+    @property
+    def head(self) -> CBlock | None:
+        return self.blocks[-1] if len(self.blocks) > 0 else None
+
+    def __getstate__(self) -> dict:
+        # only headers are pickled, the bodies of mined blocks live in the block store
+        if self.head is None:
+            return {'headers': [], 'head': None}
+        return {'headers': [block.header() for block in self.blocks[:-1]],
+                'head': (self.head.header(), BlockBody(self.head.all_txs(), list(self.head.validation_flags)))}
+
+    def __setstate__(self, state: dict):
+        self.blocks = []
+        self.heights = dict()
+        self.index = LedgerIndex()
+        if 'headers' not in state:
+            # ledgers pickled before the header split hold the whole chain below their head,
+            # each block is converted to a header and a resident body as it is unpickled
+            self.__set_legacy_chain(state.get('head'))
+            self.__init_log_state()
+            return
+        block = None
+        for header in state['headers']:
+            block = CBlock.from_header(header, block)
+            self.__place(block)
+        if state['head'] is not None:
+            header, body = state['head']
+            self.__set_head(CBlock.from_header(header, block, body))
+        self.__init_log_state()
+
+    def __set_legacy_chain(self, head: CBlock | None):
+        chain = []
+        while head is not None:
+            chain.append(head)
+            head = head.previousBlock
+        for block in reversed(chain[1:]):
+            self.__place(block)
+        if len(chain) > 0:
+            self.__set_head(chain[0])
+
+    def __place(self, block: CBlock):
+        # put a block at its height, every block from that height up is dropped
+        for dropped in self.blocks[block.id:]:
+            if self.heights.get(dropped.hash) == dropped.id:
+                del self.heights[dropped.hash]
+        del self.blocks[block.id:]
+        self.blocks.append(block)
+        if block.hash is not None:
+            self.heights[block.hash] = block.id
+
+    def __set_head(self, block: CBlock):
+        prev = block.previousBlock
+        if prev is not None and self.get_block_by_id(prev.id) is not prev:
+            # the head is built on a received block, which replaces the block at its height
+            self.__place(prev)
+        self.__place(block)
+        # the previous head was mined in place
+        if prev is not None and prev.hash is not None:
+            self.heights[prev.hash] = prev.id
+        # blocks below the head are indexed as they are accepted
+        self.index.sync(self.blocks[:block.id])
+
+    def __link(self, block: CBlock):
+        # point a block at the block of this ledger that its previous hash refers to
+        prev = self.get_block_by_id(block.id - 1)
+        block.previousBlock = prev if prev is not None and prev.hash is not None and prev.hash == block.previousHash else None
+
+    def get_chain(self) -> list[CBlock]:
+        # all blocks from genesis up to the head
+        return list(self.blocks)
+
+    def get_blocks(self, start: int = 0, stop: int = None) -> list[CBlock]:
+        # the blocks from height start up to but not including stop
+        return self.blocks[max(0, start):stop]
 
     def add_block(self, block: CBlock) -> bool:
         ledger_mutex.acquire()
-        if block.block_is_valid() and (self.head is None or self.head == block.previousBlock):
-            self.head = block
+        if block.block_is_valid() and (block.id == 0 and self.head is None
+                                       or self.head is not None and block.id == self.head.id + 1
+                                       and self.head.hash is not None and block.previousHash == self.head.hash):
+            self.__link(block)
+            self.__set_head(block)
             ledger_mutex.release()
             return True
         ledger_mutex.release()
@@ -131,9 +298,14 @@ class Ledger:
     def add_mined_block(self, block: CBlock) -> bool:
         # if block is valid, mined and previous block is validated
         ledger_mutex.acquire()
+        if self.head is None:
+            ledger_mutex.release()
+            return False
+        # a received block carries no chain, it is linked to the block of this ledger its previous hash names
+        self.__link(block)
         if (block.block_is_valid()
                 and block.state() >= BlockState.MINED
-                and (block.previousBlock is None or block.previousBlock.state() == BlockState.VALIDATED)
+                and (block.id == 0 or block.previousBlock is not None and block.previousBlock.state() == BlockState.VALIDATED)
             ):
             # if head is the block's previous block, or
             # block is the current head, block's previous block is the head's previous block, block was mined before the head
@@ -145,76 +317,173 @@ class Ledger:
                       and self.head.hash == block.previousHash
                       ):
                 # add a new block built on the mined block and make it the head
-                self.head = CBlock(block)
+                self.__set_head(CBlock(block))
                 ledger_mutex.release()
                 return True
         ledger_mutex.release()
         return False
 
     def get_block_by_id(self, block_id: int) -> CBlock:
-        if self.head.id == block_id:
-            return self.head
-        elif self.head.id < block_id < 0:
-            return None
-        else:
-            # traverse the chain
-            curr = self.head
-            while curr.previousBlock is not None:
-                if curr.previousBlock.id == block_id:
-                    return curr.previousBlock
-                curr = curr.previousBlock
-            return None
+        if 0 <= block_id < len(self.blocks):
+            return self.blocks[block_id]
+        return None
+
+    def get_block_by_hash(self, block_hash: bytes) -> CBlock | None:
+        if (height := self.heights.get(block_hash)) is not None:
+            return self.blocks[height]
+        return None
 
     def get_current_block(self) -> CBlock:
         return self.head
 
     def all_txs_from_chain(self) -> dict[str, Tx]:
-        # traverse chain and collect all txs
-        curr = self.head
+        # all txs from genesis up to the head
         txs = dict()
-        txs.update(curr.all_txs())
-
-        while curr.previousBlock is not None:
-            curr = curr.previousBlock
-            txs.update(curr.all_txs())
-
-    def get_txs_by_public_key(self, public_key: bytes) -> dict[str, Tx]:
-        # traverse chain and return all processed txs by public key
-        curr = self.head
-        txs = dict()
-
-        while curr is not None:
-            if curr.state() >= BlockState.MINED:
-                txs.update(curr.get_txs_by_public_key(public_key))
-            curr = curr.previousBlock
-
+        for block in self.blocks:
+            txs.update(block.all_txs())
         return txs
 
-    def get_tx_fees_by_public_key(self, public_key: bytes) -> float:
-        # traverse chain and return all tx fees by public key
-        curr = self.head
-        fees = 0.0
+    def get_tx_location(self, tx_hash: str) -> TxLocation | None:
+        # block id and position of a tx in a mined block
+        return self.index.locate_tx(tx_hash)
 
-        while curr is not None:
-            if curr.was_validated() and curr.mined_by == public_key:
-                fees = fsum((fees, curr.get_tx_fees()))
+    def find_tx(self, tx_hash: str) -> Tx | None:
+        if (location := self.index.locate_tx(tx_hash)) is not None:
+            return self.blocks[location.block_id].get_tx(tx_hash)
+        return self.head.get_tx(tx_hash) if self.head is not None else None
 
-            curr = curr.previousBlock
+    def get_txs_by_address(self, address: bytes) -> dict[str, Tx]:
+        # all processed txs by address, newest first
+        txs = dict()
+        if self.head is not None and self.head.state() >= BlockState.MINED:
+            txs.update(self.head.get_txs_by_address(address))
+        for tx_hash in reversed(self.index.txs_of(address)):
+            block = self.blocks[self.index.locate_tx(tx_hash).block_id]
+            if block.state() >= BlockState.MINED:
+                txs.setdefault(tx_hash, block.get_tx(tx_hash))
+        return txs
 
+    def get_tx_fees_by_address(self, address: bytes) -> int:
+        # all tx fees of validated blocks by miner address
+        fees = 0
+        for block_id in self.index.blocks_mined_by(address):
+            if (block := self.blocks[block_id]).was_validated():
+                fees += block.get_tx_fees()
+        head = self.head
+        if head is not None and head.mined_by is not None and head.was_validated() and address_of(head.mined_by) == address:
+            fees += head.get_tx_fees()
         return fees
 
-    def get_pending_txs_by_public_key(self, public_key: bytes) -> dict[str, Tx]:
-        # return all pending txs from the current block by public key
-        return self.head.get_txs_by_public_key(public_key)
+    def get_pending_txs_by_address(self, address: bytes) -> dict[str, Tx]:
+        # return all pending txs from the current block by address
+        return self.head.get_txs_by_address(address)
+
+    def __unlogged_blocks(self) -> list[CBlock]:
+        # mined blocks below the head that are not in the block log yet, oldest first
+        height = len(self.blocks) - 1
+        while height > 0 and not (height - 1 < len(self.logged_hashes)
+                                  and self.logged_hashes[height - 1] == self.blocks[height - 1].hash):
+            height -= 1
+        return self.blocks[height:-1]
 
     def save(self) -> bytes | None:
         ledger_mutex.acquire()
-        result = save_and_return_hash("ledger.dat", self)
-        ledger_mutex.release()
-        return result
+        try:
+            if block_log.root() != self.log_root:
+                # the log was written by another ledger, start it over
+                block_log.reset()
+                self.__init_log_state()
+
+            records = []
+            # body versions the log stops naming, removed once the new ones are logged
+            stale = []
+            blocks = self.__unlogged_blocks()
+            if len(blocks) > 0:
+                # a replaced block also replaces every logged block above it
+                del self.logged_hashes[blocks[0].id:]
+                del self.logged_digests[blocks[0].id:]
+            for height, digest in enumerate(self.logged_digests[:len(self.blocks) - 1]):
+                # flags added to a logged block change its body, the new digest is logged with its header
+                if self.blocks[height].body_digest != digest:
+                    records.append((BODY_RECORD, self.blocks[height].header(), self.index.entry(height)))
+                    stale.append((self.blocks[height].hash, digest))
+                    self.logged_digests[height] = self.blocks[height].body_digest
+            for block in blocks:
+                block.store_body()
+                # the index entries of a block are journaled with it
+                records.append((BLOCK_RECORD, block.header(), self.index.entry(block.id)))
+                self.logged_hashes.append(block.hash)
+                self.logged_digests.append(block.body_digest)
+
+            if self.head is not None:
+                head = (HEAD_RECORD, self.head.header(), BlockBody(self.head.all_txs(), list(self.head.validation_flags)))
+                encoded = encode_record(head)
+                if len(records) > 0 or encoded != self.logged_head:
+                    records.append(head)
+                    self.logged_head = encoded
+
+            self.log_root = block_log.append(records)
+            for block_hash, digest in stale:
+                body_store.remove(block_hash, digest)
+            return self.log_root
+        except Exception as e:
+            print(f"Saving ledger failed with error:\n{e}")
+            return None
+        finally:
+            ledger_mutex.release()
+
+    @staticmethod
+    def replay(records: list[tuple], log_root: bytes) -> Ledger:
+        # rebuild the chain from the block log, later records replace earlier ones at the same height
+        blocks: list[tuple] = []
+        head = None
+        for record in records:
+            header = record[1]
+            if record[0] == BODY_RECORD:
+                if header.id < len(blocks) and blocks[header.id][1].hash == header.hash:
+                    blocks[header.id] = record
+                continue
+            del blocks[header.id:]
+            if record[0] == BLOCK_RECORD:
+                blocks.append(record)
+                if head is not None and head[1].id <= header.id:
+                    head = None
+            elif record[0] == HEAD_RECORD:
+                head = record
+        return Ledger.from_records(blocks, head, log_root)
+
+    @staticmethod
+    def from_records(blocks: list[tuple], head: tuple | None, log_root: bytes) -> Ledger:
+        # the block and body records below the head, their journaled index entries are indexed without their bodies
+        ledger = Ledger()
+        block = None
+        for _, header, entry in blocks:
+            ledger.__place(block := CBlock.from_header(header, block))
+            ledger.index.add_entry(entry)
+        if head is not None:
+            ledger.__set_head(CBlock.from_header(head[1], block, head[2]))
+            ledger.logged_head = encode_record(head)
+        ledger.log_root = log_root
+        ledger.logged_hashes = [record[1].hash for record in blocks]
+        ledger.logged_digests = [record[1].body_digest for record in blocks]
+        return ledger
 
     @staticmethod
     def load(ledger_hash: bytes) -> Ledger:
+        if block_log.matches(ledger_hash):
+            # the index holds the latest version of every block, so journaled heads are skipped
+            indexed = block_log.indexed_records()
+            if indexed is not None:
+                blocks, head = indexed
+                headers = [record[1] for record in blocks]
+                if (head is not None and head[1].id == len(headers)
+                        and all(header.id == height for height, header in enumerate(headers))
+                        and (len(headers) == 0 or head[1].previousHash == headers[-1].hash)):
+                    return Ledger.from_records(blocks, head, ledger_hash)
+            if (records := block_log.read(ledger_hash)) is not None:
+                return Ledger.replay(records, ledger_hash)
+            return Ledger()
+        # ledgers stored before the block log are a single pickle
         ledger: Ledger = load_if_valid("ledger.dat", ledger_hash)
         return ledger if ledger is not None else Ledger()
 
@@ -225,10 +494,24 @@ pool_mutex = threading.Lock()
 class Pool:
     def __init__(self):
         self.txs: dict[str, Tx] = dict()
+        self.__init_log_state()
+
+    def __init_log_state(self):
+        # changes since the last save and the pool hash of the log after it
+        self.changes: list[tuple] = []
+        self.log_hash: bytes | None = None
+
+    def __getstate__(self) -> dict:
+        return {'txs': self.txs}
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        self.__init_log_state()
 
     def add_tx(self, tx: Tx) -> bool:
         if tx.is_valid():
             self.txs.update({tx.hash.hex(): tx})
+            self.changes.append((ADD_RECORD, tx))
             return True
         return False
 
@@ -239,27 +522,49 @@ class Pool:
         tx: Tx = self.txs.get(tx_hash)
         if tx is not None and tx.type != REWARD and tx.signed_by(sender_addr) and tx.sent_by(sender_addr):
             del self.txs[tx_hash]
+            self.changes.append((REMOVE_RECORD, tx_hash))
             return True
         return False
 
     def pop_tx(self, tx_hash: str) -> Tx | None:
         if tx_hash in self.txs.keys():
+            self.changes.append((REMOVE_RECORD, tx_hash))
             return self.txs.pop(tx_hash)
         return None
 
     def all_txs(self) -> dict[str, Tx]:
         return self.txs.copy()
 
-    def get_txs_by_public_key(self, public_key: bytes) -> dict[str, Tx]:
-        return {tx_hash: tx for tx_hash, tx in self.txs.items() if tx.sender == public_key or tx.receiver == public_key}
+    def get_txs_by_address(self, address: bytes) -> dict[str, Tx]:
+        return {tx_hash: tx for tx_hash, tx in self.txs.items() if tx.sender == address or tx.receiver == address}
 
     def save(self) -> bytes | None:
         pool_mutex.acquire()
-        result = save_and_return_hash("pool.dat", self)
-        pool_mutex.release()
-        return result
+        try:
+            if pool_log.digest() != self.log_hash:
+                # the log was written by another pool, start it over from this one
+                self.log_hash = pool_log.reset(list(self.txs.values()))
+            else:
+                self.log_hash = pool_log.append(self.changes)
+            self.changes = []
+            return self.log_hash
+        except Exception as e:
+            print(f"Saving pool failed with error:\n{e}")
+            return None
+        finally:
+            pool_mutex.release()
 
     @staticmethod
     def load(pool_hash: bytes) -> Pool:
-        pool: Pool = load_if_valid("pool.dat", pool_hash)
+        try:
+            txs, log_hash = pool_log.load()
+        except Exception:
+            txs, log_hash = None, None
+        pool = Pool()
+        if log_hash is not None and log_hash == pool_hash:
+            pool.txs = txs
+            pool.log_hash = log_hash
+            return pool
+        # pools stored before the pool log are a single pickle
+        pool = load_if_valid("pool.dat", pool_hash)
         return pool if pool is not None else Pool()
@@ -0,0 +1,103 @@
+"""
+The LedgerIndex module keeps secondary indexes over the mined blocks of the ledger for the GoodChain project.
+
+Every block below the head is indexed once, when it is accepted. The index maps each tx hash to its block
+height and position in the block, each address to the hashes of its txs in chain order and each miner
+address to the heights of the blocks it mined. Wallet history, fees earned and finding a tx become
+lookups instead of walks over the whole chain. A tx hash found at more than one height keeps a location
+per height, and is listed once per height for its addresses.
+
+The index is derived from the chain. The entries of every block are journaled with its record in the block
+log, so a loaded ledger rebuilds its index from the log, covered by the log root, without reading any body.
+"""
+
+from __future__ import annotations
+from typing import NamedTuple
+from src.Signature import address_of
+
+
+class TxLocation(NamedTuple):
+    block_id: int
+    position: int
+
+
+class IndexedBlock(NamedTuple):
+    hash: bytes
+    mined_by: bytes | None
+    # hash, sender and receiver of every tx, in block order
+    txs: list[tuple[str, bytes, bytes]]
+
+
+class LedgerIndex:
+    def __init__(self):
+        self.blocks: list[IndexedBlock] = []
+        # every location of a tx hash, in chain order
+        self.tx_locations: dict[str, list[TxLocation]] = dict()
+        self.address_txs: dict[bytes, list[str]] = dict()
+        self.mined_blocks: dict[bytes, list[int]] = dict()
+
+    def block_hashes(self) -> list[bytes]:
+        return [block.hash for block in self.blocks]
+
+    def sync(self, blocks: list) -> bool:
+        # index the given blocks by height, dropping indexed blocks they replaced, True if anything changed
+        height = min(len(self.blocks), len(blocks))
+        while height > 0 and self.blocks[height - 1].hash != blocks[height - 1].hash:
+            height -= 1
+        if height == len(self.blocks) == len(blocks):
+            return False
+        self.truncate(height)
+        for block in blocks[height:]:
+            self.add_block(block)
+        return True
+
+    def add_block(self, block):
+        # index the block at the next height
+        txs = [(tx_hash, tx.sender, tx.receiver) for tx_hash, tx in block.txs.items()]
+        mined_by = address_of(block.mined_by) if block.mined_by is not None else None
+        self.add_entry(IndexedBlock(block.hash, mined_by, txs))
+
+    def add_entry(self, entry: IndexedBlock):
+        # index the entry of a block at the next height, as journaled with its record
+        height = len(self.blocks)
+        self.blocks.append(entry)
+        for position, (tx_hash, sender, receiver) in enumerate(entry.txs):
+            self.tx_locations.setdefault(tx_hash, []).append(TxLocation(height, position))
+            for address in {sender, receiver}:
+                self.address_txs.setdefault(address, []).append(tx_hash)
+        if entry.mined_by is not None:
+            self.mined_blocks.setdefault(entry.mined_by, []).append(height)
+
+    def entry(self, height: int) -> IndexedBlock:
+        return self.blocks[height]
+
+    def truncate(self, height: int):
+        # drop every block from the height up, their entries are at the end of every list
+        for block in reversed(self.blocks[height:]):
+            for tx_hash, sender, receiver in reversed(block.txs):
+                self.__pop_last(self.tx_locations, tx_hash)
+                for address in {sender, receiver}:
+                    self.__pop_last(self.address_txs, address)
+            if block.mined_by is not None:
+                self.__pop_last(self.mined_blocks, block.mined_by)
+        del self.blocks[height:]
+
+    @staticmethod
+    def __pop_last(entries: dict, key):
+        entries[key].pop()
+        if len(entries[key]) == 0:
+            del entries[key]
+
+    def locate_tx(self, tx_hash: str) -> TxLocation | None:
+        # the first block the tx was mined in
+        locations = self.tx_locations.get(tx_hash)
+        return locations[0] if locations else None
+
+    def locate_all(self, tx_hash: str) -> list[TxLocation]:
+        return list(self.tx_locations.get(tx_hash, []))
+
+    def txs_of(self, address: bytes) -> list[str]:
+        return list(self.address_txs.get(address, []))
+
+    def blocks_mined_by(self, address: bytes) -> list[int]:
+        return list(self.mined_blocks.get(address, []))
@@ -0,0 +1,55 @@
+"""
+The Merkle module builds the Merkle tree over the tx hashes of a block.
+
+Leaves and inner nodes are hashed with a different prefix byte, so a leaf can never be passed off as an inner node.
+A node without a sibling is promoted to the next level unchanged.
+An inclusion proof is the list of sibling hashes from the leaf up to the root, each with a flag telling if the sibling is on the left.
+"""
+
+from __future__ import annotations
+import hashlib
+
+LEAF_PREFIX = b'\x00'
+NODE_PREFIX = b'\x01'
+
+
+def hash_leaf(leaf: bytes) -> bytes:
+    return hashlib.sha256(LEAF_PREFIX + leaf).digest()
+
+
+def hash_node(left: bytes, right: bytes) -> bytes:
+    return hashlib.sha256(NODE_PREFIX + left + right).digest()
+
+
+def next_level(level: list[bytes]) -> list[bytes]:
+    return [hash_node(level[i], level[i + 1]) if i + 1 < len(level) else level[i]
+            for i in range(0, len(level), 2)]
+
+
+def merkle_root(leaves: list[bytes]) -> bytes:
+    if len(leaves) == 0:
+        return hashlib.sha256(b'').digest()
+
+    level = [hash_leaf(leaf) for leaf in leaves]
+    while len(level) > 1:
+        level = next_level(level)
+    return level[0]
+
+
+def merkle_proof(leaves: list[bytes], index: int) -> list[tuple[bytes, bool]]:
+    proof = []
+    level = [hash_leaf(leaf) for leaf in leaves]
+    while len(level) > 1:
+        sibling = index ^ 1
+        if sibling < len(level):
+            proof.append((level[sibling], sibling < index))
+        level = next_level(level)
+        index //= 2
+    return proof
+
+
+def verify_merkle_proof(leaf: bytes, proof: list[tuple[bytes, bool]], root: bytes) -> bool:
+    node = hash_leaf(leaf)
+    for sibling, sibling_is_left in proof:
+        node = hash_node(sibling, node) if sibling_is_left else hash_node(node, sibling)
+    return node == root
@@ -0,0 +1,158 @@
+"""
+The Mining module holds the proof of work engine for the GoodChain project.
+
+A block header is serialized once into a canonical binary prefix (see CBlock.header_prefix).
+The SHA-256 state of that prefix is kept as a midstate, so every attempt only feeds the nonce
+instead of re-hashing the complete block.
+
+The ParallelMiner spreads disjoint nonce ranges over a pool of worker processes,
+so mining is not bound to the single core that holds the GIL.
+
+MiningStats publishes the progress of a running miner (attempts, hash rate, difficulty and ETA)
+to any thread that wants to read it, like the GUI, the logs or a metrics export.
+"""
+
+from __future__ import annotations
+import hashlib
+import os
+from multiprocessing import Pool
+from threading import Event, Lock
+from time import time
+from typing import NamedTuple
+
+NONCE_SIZE = 32
+NONCE_SPACE = 2**(NONCE_SIZE * 8)
+MINING_BATCH = 2**15
+MINING_WORKERS = os.cpu_count() or 1
+
+
+def encode_nonce(nonce: int) -> bytes:
+    return nonce.to_bytes(NONCE_SIZE, 'big')
+
+
+def encode_target(target: int) -> bytes:
+    return target.to_bytes(32, 'big')
+
+
+def meets_target(hash_candidate: bytes, target: int) -> bool:
+    return int.from_bytes(hash_candidate, 'big') <= target
+
+
+def search_nonce(prefix: bytes, target: int, start: int, count: int) -> int | None:
+    # hash the fixed header prefix once and only feed the nonce per attempt
+    midstate = hashlib.sha256(prefix)
+    # comparing equal length big endian bytes is the same as comparing the integers
+    target_bytes = encode_target(target)
+
+    for nonce in range(start, min(start + count, NONCE_SPACE)):
+        candidate = midstate.copy()
+        candidate.update(nonce.to_bytes(NONCE_SIZE, 'big'))
+        if candidate.digest() <= target_bytes:
+            return nonce
+    return None
+
+
+def next_nonce(nonce: int, count: int) -> int:
+    # advance the nonce counter and wrap around at the end of the nonce space
+    return (nonce + count) % NONCE_SPACE
+
+
+def _search_range(args: tuple[bytes, int, int, int]) -> int | None:
+    # entry point for worker processes
+    return search_nonce(*args)
+
+
+class MiningSnapshot(NamedTuple):
+    running: bool
+    workers: int
+    attempts: int
+    elapsed: float
+    hash_rate: float
+    difficulty: int
+    eta: float | None
+
+    def progress(self) -> float:
+        # share of the expected work done so far, can pass 1.0 on an unlucky run
+        return self.attempts / self.difficulty if self.difficulty > 0 else 0.0
+
+    def __str__(self) -> str:
+        eta = f"{self.eta:.1f} s" if self.eta is not None else "unknown"
+        return (f"{'mining' if self.running else 'idle'} on {self.workers} worker(s) | {self.attempts} attempts in {self.elapsed:.1f} s"
+                f" | {self.hash_rate / 1000:.1f} kH/s | difficulty {self.difficulty} | eta {eta}")
+
+
+class MiningStats:
+    def __init__(self):
+        self.lock = Lock()
+        self.running = False
+        self.workers = 0
+        self.attempts = 0
+        self.difficulty = 0
+        self.started_at = None
+        self.stopped_at = None
+
+    def start(self, difficulty: int, workers: int):
+        with self.lock:
+            self.running = True
+            self.workers = workers
+            self.attempts = 0
+            self.difficulty = difficulty
+            self.started_at = time()
+            self.stopped_at = None
+
+    def add_attempts(self, attempts: int):
+        with self.lock:
+            self.attempts += attempts
+
+    def stop(self):
+        with self.lock:
+            self.running = False
+            self.stopped_at = time()
+
+    def snapshot(self) -> MiningSnapshot:
+        with self.lock:
+            if self.started_at is None:
+                return MiningSnapshot(False, 0, 0, 0.0, 0.0, 0, None)
+            elapsed = (self.stopped_at if self.stopped_at is not None else time()) - self.started_at
+            hash_rate = self.attempts / elapsed if elapsed > 0 else 0.0
+            # time left until the expected number of attempts is reached
+            eta = max(0.0, (self.difficulty - self.attempts) / hash_rate) if hash_rate > 0 else None
+            return MiningSnapshot(self.running, self.workers, self.attempts, elapsed, hash_rate, self.difficulty, eta)
+
+
+class ParallelMiner:
+    def __init__(self, workers: int = MINING_WORKERS, cancel: Event = None, stats: MiningStats = None):
+        self.workers = workers
+        self.cancel = cancel if cancel is not None else Event()
+        self.stats = stats if stats is not None else MiningStats()
+        self.pool = None
+
+    def __enter__(self) -> ParallelMiner:
+        if self.workers > 1:
+            self.pool = Pool(self.workers)
+        return self
+
+    def __exit__(self, *args):
+        if self.pool is not None:
+            # stop every worker right away, the winner is already known
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+    def batch_size(self) -> int:
+        return MINING_BATCH * self.workers
+
+    def search(self, prefix: bytes, target: int, start: int) -> int | None:
+        # search one batch of nonces starting at start, split in disjoint ranges per worker
+        if self.pool is None:
+            found = search_nonce(prefix, target, start, MINING_BATCH)
+            self.stats.add_attempts(MINING_BATCH)
+            return found
+
+        ranges = [(prefix, target, next_nonce(start, MINING_BATCH * w), MINING_BATCH)
+                  for w in range(self.workers)]
+        for found in self.pool.imap_unordered(_search_range, ranges):
+            self.stats.add_attempts(MINING_BATCH)
+            if found is not None or self.cancel.is_set():
+                return found
+        return None
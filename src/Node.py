@@ -53,15 +53,17 @@ For example, if there is a new block created by another node, but it is not yet
 """
 from __future__ import annotations
 import pickle
+import struct
 from queue import Queue
 from threading import Thread
 from typing import NamedTuple
 from time import sleep
 from src.Data import Accounts, Ledger, Pool, compose_relative_filepath
 from src.BlockChain import *
-from src.Transaction import Tx, REWARD, REWARD_VALUE, NORMAL
+from src.Transaction import Tx, REWARD, REWARD_VALUE, NORMAL, to_units
 from src.Signature import generate_keys, encode_keys
-from src.User import User
+from src.Mining import MINING_WORKERS, MiningStats
+from src.User import User, KeySession
 from src.SocketUtil import NODES, send_object, start_listening_thread, broadcast, received_objects, NODE_PORT, NODE_IP
 
 
@@ -69,18 +71,22 @@ class NodeActionResult(Enum):
     SUCCESS = 0
     FAIL = 1
     INVALID = 2
+    CANCELLED = 3
 
 
 class Wallet(NamedTuple):
     processed: dict[str, Tx]
     pending: dict[str, Tx]
-    incoming: float
-    outgoing: float
-    reserved: float
-    fees: float
-    available: float
+    incoming: int
+    outgoing: int
+    reserved: int
+    fees: int
+    available: int
 
 
+# Accounts, ledger and pool hash, zero bytes stand for a missing hash
+STORED_HASHES = struct.Struct('>32s32s32s')
+
 # Queue to pass system messages to GUI
 system_messages = Queue()
 
@@ -92,9 +98,12 @@ class Node:
         self.ledger: Ledger = Ledger.load(self.ledger_hash)
         self.pool: Pool = Pool.load(self.pool_hash)
         self.user: User = None
+        self.session: KeySession = None
         self.user_wallet: Wallet = None
         self.curr_block: CBlock = self.ledger.get_current_block()
-        if len(self.accounts.users) == 0 and self.ledger.get_current_block() is None:
+        self.mining_job: MiningJob = None
+        self.mining_stats = MiningStats()
+        if self.accounts.user_count() == 0 and self.ledger.get_current_block() is None:
             # Create system files upon minting the genesis block
             self.ledger.add_block(CBlock())
             self.curr_block = self.ledger.get_current_block()
@@ -132,7 +141,11 @@ class Node:
         try:
             hashfile = compose_relative_filepath('file_hashes.dat')
             with open(hashfile, 'rb') as f:
-                return pickle.load(f)
+                content = f.read()
+            if len(content) != STORED_HASHES.size:
+                # hashes stored before the fixed layout are a pickled tuple
+                return pickle.loads(content)
+            return tuple(h if h != bytes(32) else None for h in STORED_HASHES.unpack(content))
         except:
             return (None, None, None)
 
@@ -140,7 +153,8 @@ class Node:
         # TODO: Set environment variables ACC_HASH, LEDGER_HASH, POOL_HASH
         hashfile = compose_relative_filepath('file_hashes.dat')
         with open(hashfile, 'wb+') as f:
-            pickle.dump((self.acc_hash, self.ledger_hash, self.pool_hash), f)
+            f.write(STORED_HASHES.pack(*(h if h is not None else bytes(32)
+                                         for h in (self.acc_hash, self.ledger_hash, self.pool_hash))))
 
     def register(self, username: str, password: str):
         if not self.accounts.user_exists(username):
@@ -177,13 +191,17 @@ class Node:
             user = self.accounts.get_user(username)
             if user.authorize(password):
                 self.user = user
+                if self.session is not None:
+                    # keys of a previous login are not kept around
+                    self.session.close()
+                self.session = KeySession(user)
                 self.user_wallet = self.get_user_wallet(user)
 
                 # validation of blocks on chain
-                cblock = self.ledger.get_current_block()
-                while (cblock is not None and not cblock.was_validated_by(self.user.get_public_key())):
+                for cblock in reversed(self.ledger.get_chain()):
+                    if cblock.was_validated_by(self.user.get_public_key()):
+                        break
                     self.validate_block(password, cblock)
-                    cblock = cblock.previousBlock
 
                 return NodeActionResult.SUCCESS
             else:
@@ -192,6 +210,9 @@ class Node:
         return NodeActionResult.INVALID
 
     def logout(self):
+        if self.session is not None:
+            self.session.close()
+        self.session = None
         self.user = None
         self.user_wallet = None
         return NodeActionResult.SUCCESS
@@ -199,7 +220,7 @@ class Node:
     def validate_block(self, password: str, cblock: CBlock):
         if cblock.state() >= BlockState.MINED and self.user.authorize(password):
             try:
-                priv_key, pub_key = self.user.get_rsa_keys(password)
+                priv_key, pub_key = self.session.unlock(password)
                 if cblock.validate_block(priv_key, pub_key):
                     flag = cblock.get_validation_flag(pub_key)
                     broadcast(flag)
@@ -209,7 +230,7 @@ class Node:
                         # pay reward to miner upon adding third validation flag
                         reward_tx = Tx(REWARD_VALUE, REWARD_VALUE, 0.0,
                                        pub_key,
-                                       decode_public_key(cblock.mined_by),
+                                       cblock.mined_by,
                                        REWARD
                                        )
                         reward_tx.sign(priv_key)
@@ -227,12 +248,17 @@ class Node:
     def mine_block(self, miner_password: str):
         if self.curr_block.state() == BlockState.READY and self.user.authorize(miner_password):
             try:
-                miner_priv_key, miner_pub_key = self.user.get_rsa_keys(
+                miner_priv_key, miner_pub_key = self.session.unlock(
                     miner_password)
-                new: CBlock = self.curr_block.mine(miner_priv_key,
-                                                   miner_pub_key
-                                                   )
-                if new is not self.curr_block and self.curr_block.state() == BlockState.MINED:
+                self.mining_job = MiningJob(self.curr_block,
+                                            MINING_WORKERS,
+                                            self.mining_stats
+                                            )
+                new = self.mining_job.run(miner_priv_key, miner_pub_key)
+                print(f"Mining block {self.mining_job.block.id} stopped: {self.mining_stats.snapshot()}")
+                if self.mining_job.is_cancelled():
+                    return NodeActionResult.CANCELLED
+                if new is not None and self.curr_block.state() == BlockState.MINED:
                     if self.ledger.add_block(new):
                         # send mined block to network
                         broadcast(self.curr_block)
@@ -245,8 +271,17 @@ class Node:
             except Exception as e:
                 print(f"Mining failed with exception:\n{e}")
                 return NodeActionResult.FAIL
+            finally:
+                self.mining_job = None
         return NodeActionResult.INVALID
 
+    def cancel_mining(self) -> NodeActionResult:
+        job = self.mining_job
+        if job is None:
+            return NodeActionResult.INVALID
+        job.cancel()
+        return NodeActionResult.SUCCESS
+
     def auto_fill_rewards(self):
         head = self.ledger.get_current_block()
         if head.state() <= BlockState.READY:
@@ -318,10 +353,10 @@ class Node:
                 return NodeActionResult.FAIL
         return NodeActionResult.INVALID
 
-    def create_tx(self, input: float, output: float, fee: float, sender_password: str, receiver: rsa.RSAPublicKey):
-        if self.user and self.user.authorize(sender_password) and self.user_wallet.available >= input and isclose(input, fsum((output, fee))):
+    def create_tx(self, input: float, output: float, fee: float, sender_password: str, receiver: PublicKey):
+        if self.user and self.user.authorize(sender_password) and self.user_wallet.available >= to_units(input) and to_units(input) == to_units(output) + to_units(fee):
             try:
-                sender_priv_key, sender_pub_key = self.user.get_rsa_keys(
+                sender_priv_key, sender_pub_key = self.session.unlock(
                     sender_password)
                 tx = Tx(input, output, fee,
                         sender_pub_key,
@@ -339,7 +374,7 @@ class Node:
 
     def cancel_tx(self, tx_hash: str):
         try:
-            self.pool.cancel_tx(tx_hash, self.user.public_key)
+            self.pool.cancel_tx(tx_hash, self.user.get_address())
             self.user_wallet = self.get_user_wallet(self.user)
             self.save_pool()
             # TODO: broadcast tx cancellation
@@ -348,30 +383,27 @@ class Node:
             return NodeActionResult.FAIL
 
     def get_user_wallet(self, user: User) -> Wallet:
-        processed: dict[str, Tx] = self.ledger.get_txs_by_public_key(
-            user.public_key)
+        address = user.get_address()
+
+        processed: dict[str, Tx] = self.ledger.get_txs_by_address(address)
 
-        pending: dict[str, Tx] = self.pool.get_txs_by_public_key(
-            user.public_key)
+        pending: dict[str, Tx] = self.pool.get_txs_by_address(address)
         pending.update(
-            self.ledger.get_pending_txs_by_public_key(user.public_key))
+            self.ledger.get_pending_txs_by_address(address))
 
-        incoming = fsum(tx.get_output() for tx in processed.values()
-                        if tx.receiver == user.public_key)
+        # balances are exact sums of base units
+        incoming = sum(tx.get_output() for tx in processed.values()
+                       if tx.receiver == address)
 
-        outgoing = fsum(tx.get_input() for tx in processed.values()
-                        if tx.sender == user.public_key if tx.type == NORMAL)
+        outgoing = sum(tx.get_input() for tx in processed.values()
+                       if tx.sender == address if tx.type == NORMAL)
 
-        reserved = fsum(tx.get_input() for tx in pending.values()
-                        if tx.sender == user.public_key if tx.type == NORMAL)
+        reserved = sum(tx.get_input() for tx in pending.values()
+                       if tx.sender == address if tx.type == NORMAL)
 
-        fees = self.ledger.get_tx_fees_by_public_key(user.public_key)
+        fees = self.ledger.get_tx_fees_by_address(address)
 
-        available = fsum((incoming,
-                          -outgoing,
-                          -reserved,
-                          fees)
-                         )
+        available = incoming - outgoing - reserved + fees
 
         return Wallet(processed,
                       pending,
@@ -417,7 +449,7 @@ class Node:
                     case Tx() as tx:
                         if tx.type == NORMAL:
                             # lookup user and wallet to check if sender had balance to send tx
-                            user = self.accounts.get_user_by_public_key(
+                            user = self.accounts.get_user_by_address(
                                 tx.sender)
                             wallet = self.get_user_wallet(user)
                             if wallet.available >= tx.get_input():
@@ -441,6 +473,10 @@ class Node:
                         if self.ledger.add_mined_block(new_block):
                             print(
                                 f"Received new block: {new_block}\nUpdating Tx Pool...")
+                            job = self.mining_job
+                            if job is not None and job.block is not self.ledger.get_current_block():
+                                # the head moved on, so the block being mined is stale
+                                job.cancel()
                             # print(f"Updating txs pool: {new_block.txs}")
                             for key in new_block.txs:
                                 if key in self.pool.txs:
@@ -456,15 +492,15 @@ class Node:
                         else:
                             print(f"Received and rejected block: {new_block}")
                     case ValidationFlag() as flag:
-                        if self.ledger.get_block_by_id(flag.block_id).add_validation_flag(flag.signature, flag.public_key):
+                        if self.ledger.get_block_by_id(flag.block_id).add_validation_flag(flag.signature, flag.address):
                             print(
-                                f"Received new validation flag for block: {flag.block_id} from {flag.public_key.hex()}")
+                                f"Received new validation flag for block: {flag.block_id} from {flag.address.hex()}")
                             self.save_ledger()
                             system_messages.put(
-                                f"NEW FLAG: Block #{flag.block_id}\nvalidated by {flag.public_key.hex()}\n{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+                                f"NEW FLAG: Block #{flag.block_id}\nvalidated by {flag.address.hex()}\n{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
                         else:
                             print(
-                                f"Received and rejected validation flag for block: {flag.block_id} from {flag.public_key.hex()}")
+                                f"Received and rejected validation flag for block: {flag.block_id} from {flag.address.hex()}")
                     case NodeSummary() as summary:
                         # Update other node's summary
                         print(
@@ -564,7 +600,7 @@ class Node:
 
     def __get_summary(self):
         txs = {tx_hash for tx_hash in self.pool.txs.keys()}
-        users = {username for username in self.accounts.users.keys()}
+        users = set(self.accounts.usernames())
         return NodeSummary(self.ledger.head.id, txs, users)
 
 
@@ -0,0 +1,258 @@
+"""
+The PoolLog module keeps the transaction pool on disk as a write-ahead log for the GoodChain project.
+
+Every change to the pool is appended as an add or remove record, so accepting a tx costs one small write
+instead of pickling the whole pool. Appends are flushed right away and fsynced in batches, at most
+SYNC_INTERVAL seconds after the first unsynced append.
+
+Once the log holds COMPACT_RATIO times more records than there are pending txs, a new log is started and
+a background thread writes the pending txs to a snapshot, after which the older logs are removed.
+
+The pool hash is an additive set hash over the pending txs. Adding or removing a tx updates it in O(1) and
+it does not depend on how the txs are laid out on disk, so compaction leaves the stored hash valid.
+The element of a tx is a 2048 bit SHAKE-256 digest of its recomputed hash and its signature, and elements
+are summed modulo 2**2048, wide enough that no set of other txs can be found to sum to the same hash.
+"""
+
+from __future__ import annotations
+import hashlib
+import os
+import pickle
+import threading
+from pathlib import Path
+from src.BlockStore import compose_relative_filepath
+from src.BlockLog import RECORD_LENGTH, encode_record
+
+SYNC_INTERVAL = 0.05  # seconds an append may wait for its fsync
+COMPACT_RATIO = 4  # compact once the logs hold this many records per pending tx
+COMPACT_MIN_RECORDS = 1024  # smaller logs are never compacted
+SET_HASH_BYTES = 256
+SET_HASH_MODULUS = 2 ** (8 * SET_HASH_BYTES)
+
+ADD_RECORD = 0  # (ADD_RECORD, tx), replaces a pending tx with the same hash
+REMOVE_RECORD = 1  # (REMOVE_RECORD, tx hash in hex)
+
+
+def tx_element(tx) -> int:
+    # the set hash element of a tx, its hash is recomputed from its fields so a changed field changes the element
+    digest = hashlib.shake_256((tx.compute_hash() or b'') + (tx.sig if tx.sig is not None else b''))
+    return int.from_bytes(digest.digest(SET_HASH_BYTES), 'big')
+
+
+def read_records(data: bytes) -> tuple[list[tuple], int]:
+    # the complete records in a log and where they end, a record cut short by a crash is dropped
+    records = []
+    offset = 0
+    while offset + RECORD_LENGTH.size <= len(data):
+        (length,) = RECORD_LENGTH.unpack_from(data, offset)
+        start = offset + RECORD_LENGTH.size
+        if start + length > len(data):
+            break
+        records.append(pickle.loads(data[start:start + length]))
+        offset = start + length
+    return records, offset
+
+
+class PoolLog:
+    def __init__(self, directory: Path, sync_interval: float = SYNC_INTERVAL,
+                 compact_ratio: int = COMPACT_RATIO, compact_min_records: int = COMPACT_MIN_RECORDS):
+        self.directory = directory
+        self.sync_interval = sync_interval
+        self.compact_ratio = compact_ratio
+        self.compact_min_records = compact_min_records
+        # the pending txs as logged, mirrored so a snapshot never has to replay the logs
+        self.txs: dict[str, object] = dict()
+        self.set_hash = 0
+        self.generation = 0
+        self.records = 0
+        self.wal = None
+        # size and mtime of the current log after our last write, anything else was written by another log object
+        self.stamp = None
+        self.sync_timer: threading.Timer | None = None
+        self.compaction: threading.Thread | None = None
+        self.lock = threading.Lock()
+
+    def snapshot_path(self) -> Path:
+        return self.directory / "snapshot.dat"
+
+    def wal_path(self, generation: int) -> Path:
+        return self.directory / f"wal-{generation:05}.log"
+
+    def digest(self) -> bytes:
+        with self.lock:
+            self.__refresh()
+            return self.__digest()
+
+    def load(self) -> tuple[dict[str, object], bytes]:
+        # the pending txs on disk and their pool hash
+        with self.lock:
+            self.__load()
+            return self.txs.copy(), self.__digest()
+
+    def append(self, records: list[tuple]) -> bytes:
+        # append records to the current log and return the new pool hash
+        with self.lock:
+            self.__refresh()
+            if len(records) == 0:
+                return self.__digest()
+            if self.wal is None:
+                self.__open_wal(self.generation)
+            self.wal.write(b''.join(encode_record(record) for record in records))
+            self.wal.flush()
+            for record in records:
+                self.__apply(record)
+            self.records += len(records)
+            self.stamp = self.__stat(self.generation)
+            self.__schedule_sync()
+            if self.records >= max(self.compact_min_records, self.compact_ratio * len(self.txs)):
+                self.__start_compaction()
+            return self.__digest()
+
+    def reset(self, txs: list) -> bytes:
+        # replace the log with a snapshot of the given txs
+        with self.lock:
+            self.__join_compaction()
+            self.__load()
+            self.txs = {tx.hash.hex(): tx for tx in txs}
+            self.set_hash = sum(map(tx_element, txs)) % SET_HASH_MODULUS
+            generation = self.generation + 1
+            self.__write_snapshot(generation, txs)
+            self.__open_wal(generation)
+            self.__remove_older_wals(generation)
+            self.records = 0
+            return self.__digest()
+
+    def sync(self):
+        with self.lock:
+            self.sync_timer = None
+            if self.wal is not None:
+                os.fsync(self.wal.fileno())
+
+    def close(self):
+        with self.lock:
+            self.__join_compaction()
+            if self.sync_timer is not None:
+                self.sync_timer.cancel()
+                self.sync_timer = None
+            self.__close_wal()
+
+    def __digest(self) -> bytes:
+        return hashlib.sha256(self.set_hash.to_bytes(SET_HASH_BYTES, 'big')).digest()
+
+    def __apply(self, record: tuple):
+        if record[0] == ADD_RECORD:
+            key = record[1].hash.hex()
+            if key in self.txs:
+                self.set_hash -= tx_element(self.txs[key])
+            self.txs[key] = record[1]
+            self.set_hash = (self.set_hash + tx_element(record[1])) % SET_HASH_MODULUS
+        elif record[0] == REMOVE_RECORD and record[1] in self.txs:
+            self.set_hash = (self.set_hash - tx_element(self.txs.pop(record[1]))) % SET_HASH_MODULUS
+
+    def __stat(self, generation: int) -> tuple[int, int, int] | None:
+        try:
+            stat = self.wal_path(generation).stat()
+            return generation, stat.st_size, stat.st_mtime_ns
+        except OSError:
+            return None
+
+    def __refresh(self):
+        # reload when another log object wrote to the directory since our last write
+        if self.stamp is None or self.__stat(self.generation) != self.stamp:
+            self.__load()
+
+    def __load(self):
+        self.__join_compaction()
+        self.__close_wal()
+        self.txs = dict()
+        self.set_hash = 0
+        self.records = 0
+        try:
+            with open(self.snapshot_path(), "rb") as f:
+                self.generation, txs = pickle.load(f)
+        except FileNotFoundError:
+            self.generation, txs = 0, []
+        for tx in txs:
+            self.__apply((ADD_RECORD, tx))
+        # logs left behind by a compaction that did not finish are replayed after its snapshot
+        while self.wal_path(self.generation + 1).exists():
+            self.__replay(self.generation)
+            self.generation += 1
+        self.__replay(self.generation)
+        self.stamp = self.__stat(self.generation)
+
+    def __replay(self, generation: int):
+        try:
+            with open(self.wal_path(generation), "r+b") as f:
+                data = f.read()
+                records, end = read_records(data)
+                if end < len(data):
+                    # appends must not follow a partial record
+                    f.truncate(end)
+        except FileNotFoundError:
+            return
+        for record in records:
+            self.__apply(record)
+        self.records += len(records)
+
+    def __open_wal(self, generation: int):
+        self.__close_wal()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.generation = generation
+        self.wal = open(self.wal_path(generation), "ab")
+        self.stamp = self.__stat(generation)
+
+    def __close_wal(self):
+        if self.wal is not None:
+            self.wal.flush()
+            os.fsync(self.wal.fileno())
+            self.wal.close()
+            self.wal = None
+
+    def __schedule_sync(self):
+        # appends within one interval share a single fsync
+        if self.sync_timer is None:
+            self.sync_timer = threading.Timer(self.sync_interval, self.sync)
+            self.sync_timer.daemon = True
+            self.sync_timer.start()
+
+    def __start_compaction(self):
+        if self.compaction is not None and self.compaction.is_alive():
+            return
+        # new records go to the next log while the snapshot of the current txs is written
+        txs = list(self.txs.values())
+        generation = self.generation + 1
+        self.__open_wal(generation)
+        self.records = 0
+        self.compaction = threading.Thread(target=self.__compact, args=(generation, txs), daemon=True)
+        self.compaction.start()
+
+    def __compact(self, generation: int, txs: list):
+        try:
+            self.__write_snapshot(generation, txs)
+            self.__remove_older_wals(generation)
+        except Exception as e:
+            print(f"Compacting pool log failed with error:\n{e}")
+
+    def __join_compaction(self):
+        if self.compaction is not None:
+            self.compaction.join()
+            self.compaction = None
+
+    def __write_snapshot(self, generation: int, txs: list):
+        # replace the snapshot in one step, so a crash leaves either the old or the new one
+        self.directory.mkdir(parents=True, exist_ok=True)
+        temp = self.snapshot_path().with_suffix(".tmp")
+        with open(temp, "wb+") as f:
+            pickle.dump((generation, txs), f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp, self.snapshot_path())
+
+    def __remove_older_wals(self, generation: int):
+        for path in self.directory.glob("wal-*.log"):
+            if int(path.stem.split("-")[1]) < generation:
+                path.unlink(missing_ok=True)
+
+
+pool_log = PoolLog(compose_relative_filepath("pool"))
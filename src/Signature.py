@@ -2,39 +2,221 @@
 """
 """
 
+import hashlib
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import NamedTuple
 from cryptography.exceptions import *
-from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.hazmat.primitives.asymmetric import rsa, ed25519
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.asymmetric import padding
 from cryptography.hazmat.primitives import serialization
 
+# signature schemes, the tag is the first byte of every signature
+RSA = 0
+ED25519 = 1
+DEFAULT_SCHEME = ED25519  # for new accounts, RSA is kept for existing ones
 
-def generate_keys() -> tuple[rsa.RSAPrivateKey, rsa.RSAPublicKey]:
-    private_key = rsa.generate_private_key(
-        public_exponent=65537, key_size=2048)
-    public_key = private_key.public_key()
-    return private_key, public_key
+PublicKey = rsa.RSAPublicKey | ed25519.Ed25519PublicKey
+PrivateKey = rsa.RSAPrivateKey | ed25519.Ed25519PrivateKey
 
-# Sign a passed message using a given private key
-# Make sure the message is encoded correctly before signing
-# Signing and verifying algorithms must be the same
+VERIFY_CACHE_SIZE = 8192
+PUBLIC_KEY_CACHE_SIZE = 4096
+ADDRESS_SIZE = 32
 
 
-def sign(message: bytes, private_key: rsa.RSAPrivateKey) -> bytes:
-    signed = private_key.sign(
-        message,
-        padding.PSS(
-            mgf=padding.MGF1(hashes.SHA256()),
-            salt_length=padding.PSS.MAX_LENGTH),
-        hashes.SHA256())
-    return signed
+class CacheStats(NamedTuple):
+    hits: int
+    misses: int
+    size: int
 
 
-# Verify a signature for a message using a given public key
-# Make sure the message is decoded correctly before verifying
-# Signing and verifying algorithms values must be the same
-def verify(message: bytes, signature: bytes, public_key: rsa.RSAPublicKey) -> bool:
-    try:
+# Bounded LRU of (message, signature, public key) triples that verified successfully
+# Only positive results are stored, a failed check is always repeated
+class VerifyCache:
+    def __init__(self, maxsize: int = VERIFY_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.entries: OrderedDict[bytes, None] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(message: bytes, signature: bytes, public_key: PublicKey | bytes) -> bytes:
+        encoded = public_key if isinstance(public_key, bytes) else encode_public_key(public_key)
+        digest = hashlib.sha256()
+        for part in (message, signature, encoded):
+            # length prefix keeps the concatenation unambiguous
+            digest.update(len(part).to_bytes(4, 'big'))
+            digest.update(part)
+        return digest.digest()
+
+    def lookup(self, key: bytes) -> bool:
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return True
+            self.misses += 1
+            return False
+
+    def add(self, key: bytes):
+        with self.lock:
+            self.entries[key] = None
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> CacheStats:
+        with self.lock:
+            return CacheStats(self.hits, self.misses, len(self.entries))
+
+
+verify_cache = VerifyCache()
+
+
+# Interning cache of loaded public keys by their encoded PEM bytes
+# Keys are parsed once per process and encoding an interned key returns the stored PEM
+class PublicKeyCache:
+    def __init__(self, maxsize: int = PUBLIC_KEY_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.keys: OrderedDict[bytes, PublicKey] = OrderedDict()
+        # loaded keys are not hashable, so they are looked up by identity
+        self.encoded: dict[int, tuple[PublicKey, bytes]] = dict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def decode(self, key: bytes) -> PublicKey:
+        with self.lock:
+            if key in self.keys:
+                self.keys.move_to_end(key)
+                self.hits += 1
+                return self.keys[key]
+            self.misses += 1
+
+        public_key = serialization.load_pem_public_key(key)
+
+        with self.lock:
+            if key in self.keys:
+                # loaded by another thread in the meantime
+                return self.keys[key]
+            self.keys[key] = public_key
+            self.encoded[id(public_key)] = (public_key, key)
+            while len(self.keys) > self.maxsize:
+                _, evicted = self.keys.popitem(last=False)
+                del self.encoded[id(evicted)]
+        return public_key
+
+    def encode(self, public_key: PublicKey) -> bytes | None:
+        with self.lock:
+            interned = self.encoded.get(id(public_key))
+        return interned[1] if interned is not None and interned[0] is public_key else None
+
+    def clear(self):
+        with self.lock:
+            self.keys.clear()
+            self.encoded.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> CacheStats:
+        with self.lock:
+            return CacheStats(self.hits, self.misses, len(self.keys))
+
+
+public_key_cache = PublicKeyCache()
+
+
+# Directory of known public keys by their address, the SHA-256 of the DER encoded key
+# Txs and blocks only carry addresses, the full key is looked up when a signature is verified
+class KeyDirectory:
+    def __init__(self):
+        self.keys: dict[bytes, bytes] = dict()
+        self.addresses: dict[bytes, bytes] = dict()
+        self.lock = threading.Lock()
+
+    def register(self, key: bytes) -> bytes:
+        with self.lock:
+            if key in self.addresses:
+                return self.addresses[key]
+
+        der = decode_public_key(key).public_bytes(
+            encoding=serialization.Encoding.DER,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo
+        )
+        address = hashlib.sha256(der).digest()
+
+        with self.lock:
+            self.keys[address] = key
+            self.addresses[key] = address
+        return address
+
+    def resolve(self, address: bytes) -> bytes | None:
+        with self.lock:
+            return self.keys.get(address)
+
+    def clear(self):
+        with self.lock:
+            self.keys.clear()
+            self.addresses.clear()
+
+
+key_directory = KeyDirectory()
+
+
+# A signature scheme generates key pairs and signs and verifies untagged signatures
+# The scheme of a key follows from its type, encoded keys carry it as their algorithm identifier
+class SignatureScheme(ABC):
+    tag: int
+    private_type: type
+    public_type: type
+
+    @abstractmethod
+    def generate(self) -> tuple[PrivateKey, PublicKey]:
+        ...
+
+    @abstractmethod
+    def sign(self, message: bytes, private_key: PrivateKey) -> bytes:
+        ...
+
+    @abstractmethod
+    def verify(self, message: bytes, signature: bytes, public_key: PublicKey):
+        # raises InvalidSignature
+        ...
+
+    def untag(self, signature: bytes, public_key: PublicKey) -> bytes | None:
+        if len(signature) > 1 and signature[0] == self.tag:
+            return signature[1:]
+        return None
+
+
+class RSAScheme(SignatureScheme):
+    tag = RSA
+    private_type = rsa.RSAPrivateKey
+    public_type = rsa.RSAPublicKey
+
+    def generate(self) -> tuple[PrivateKey, PublicKey]:
+        private_key = rsa.generate_private_key(
+            public_exponent=65537, key_size=2048)
+        return private_key, private_key.public_key()
+
+    def sign(self, message: bytes, private_key: rsa.RSAPrivateKey) -> bytes:
+        return private_key.sign(
+            message,
+            padding.PSS(
+                mgf=padding.MGF1(hashes.SHA256()),
+                salt_length=padding.PSS.MAX_LENGTH),
+            hashes.SHA256())
+
+    def verify(self, message: bytes, signature: bytes, public_key: rsa.RSAPublicKey):
         public_key.verify(
             signature,
             message,
@@ -42,12 +224,72 @@ def verify(message: bytes, signature: bytes, public_key: rsa.RSAPublicKey) -> bo
                 mgf=padding.MGF1(hashes.SHA256()),
                 salt_length=padding.PSS.MAX_LENGTH),
             hashes.SHA256())
+
+    def untag(self, signature: bytes, public_key: rsa.RSAPublicKey) -> bytes | None:
+        # signatures made before the scheme tag are exactly one key size long
+        if len(signature) == public_key.key_size // 8:
+            return signature
+        return super().untag(signature, public_key)
+
+
+class Ed25519Scheme(SignatureScheme):
+    tag = ED25519
+    private_type = ed25519.Ed25519PrivateKey
+    public_type = ed25519.Ed25519PublicKey
+
+    def generate(self) -> tuple[ed25519.Ed25519PrivateKey, ed25519.Ed25519PublicKey]:
+        private_key = ed25519.Ed25519PrivateKey.generate()
+        return private_key, private_key.public_key()
+
+    def sign(self, message: bytes, private_key: ed25519.Ed25519PrivateKey) -> bytes:
+        return private_key.sign(message)
+
+    def verify(self, message: bytes, signature: bytes, public_key: ed25519.Ed25519PublicKey):
+        public_key.verify(signature, message)
+
+
+SCHEMES: dict[int, SignatureScheme] = {RSA: RSAScheme(), ED25519: Ed25519Scheme()}
+
+
+def scheme_of(key: PrivateKey | PublicKey) -> SignatureScheme:
+    for scheme in SCHEMES.values():
+        if isinstance(key, (scheme.private_type, scheme.public_type)):
+            return scheme
+    raise TypeError(f"Unsupported key type: {type(key).__name__}")
+
+
+def generate_keys(scheme: int = DEFAULT_SCHEME) -> tuple[PrivateKey, PublicKey]:
+    return SCHEMES[scheme].generate()
+
+# Sign a passed message using a given private key
+# Make sure the message is encoded correctly before signing
+# The signature is tagged with the scheme of the key
+
+
+def sign(message: bytes, private_key: PrivateKey) -> bytes:
+    scheme = scheme_of(private_key)
+    return bytes((scheme.tag,)) + scheme.sign(message, private_key)
+
+
+# Verify a signature for a message using a given public key
+# Make sure the message is decoded correctly before verifying
+# The signature tag must match the scheme of the key
+def verify(message: bytes, signature: bytes, public_key: PublicKey) -> bool:
+    key = verify_cache.key(message, signature, public_key)
+    if verify_cache.lookup(key):
+        return True
+    scheme = scheme_of(public_key)
+    if (untagged := scheme.untag(signature, public_key)) is None:
+        return False
+    try:
+        scheme.verify(message, untagged, public_key)
+        verify_cache.add(key)
         return True
     except InvalidSignature:
         return False
 
 
-def encode_keys(keys: tuple[rsa.RSAPrivateKey, rsa.RSAPublicKey], pw: str) -> tuple[bytes, bytes]:
+def encode_keys(keys: tuple[PrivateKey, PublicKey], pw: str) -> tuple[bytes, bytes]:
     prv_key, pbc_key = keys
     priv = prv_key.private_bytes(
         encoding=serialization.Encoding.PEM,
@@ -62,25 +304,45 @@ def encode_keys(keys: tuple[rsa.RSAPrivateKey, rsa.RSAPublicKey], pw: str) -> tu
     return priv, pub
 
 
-def decode_keys(keys: tuple[bytes, bytes], pw: str) -> tuple[rsa.RSAPrivateKey, rsa.RSAPublicKey]:
+def decode_keys(keys: tuple[bytes, bytes], pw: str) -> tuple[PrivateKey, PublicKey]:
     prv_key, pbc_key = keys
 
     priv = serialization.load_pem_private_key(
         prv_key,
         password=pw.encode('utf8'),
     )
-    pub = serialization.load_pem_public_key(
-        pbc_key
-    )
+    pub = decode_public_key(pbc_key)
     return priv, pub
 
 
-def decode_public_key(key: bytes) -> rsa.RSAPublicKey:
-    return serialization.load_pem_public_key(key)
+def decode_public_key(key: bytes) -> PublicKey:
+    return public_key_cache.decode(key)
 
 
-def encode_public_key(key: rsa.RSAPublicKey) -> bytes:
+def encode_public_key(key: PublicKey) -> bytes:
+    if (encoded := public_key_cache.encode(key)) is not None:
+        return encoded
     return key.public_bytes(
         encoding=serialization.Encoding.PEM,
         format=serialization.PublicFormat.SubjectPublicKeyInfo
     )
+
+
+def address_of(key: PublicKey | bytes) -> bytes:
+    # accepts a loaded key, a PEM encoded key or an address
+    if isinstance(key, bytes):
+        return key if len(key) == ADDRESS_SIZE else key_directory.register(key)
+    return key_directory.register(encode_public_key(key))
+
+
+def resolve_public_key(key: bytes) -> PublicKey | None:
+    # accepts a PEM encoded key or the address of a registered key
+    if len(key) != ADDRESS_SIZE:
+        return decode_public_key(key)
+    encoded = key_directory.resolve(key)
+    return decode_public_key(encoded) if encoded is not None else None
+
+
+def verify_by_address(message: bytes, signature: bytes, address: bytes) -> bool:
+    public_key = resolve_public_key(address)
+    return public_key is not None and verify(message, signature, public_key)
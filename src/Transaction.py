@@ -1,6 +1,8 @@
 from __future__ import annotations
-from math import fsum, isclose
 from datetime import datetime
+from time import time_ns
+import hashlib
+import struct
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.backends import default_backend
 
@@ -10,66 +12,157 @@ REWARD_VALUE = 50.0
 NORMAL = 0
 REWARD = 1
 
+UNITS_PER_COIN = 10**8  # amounts are stored as whole base units
+MAX_UNITS = 2**63 - 1  # amounts are encoded as signed 64 bit integers
+REWARD_UNITS = int(REWARD_VALUE) * UNITS_PER_COIN
+# type, input, output, fee, created_at in ns, sender and receiver addresses
+TX_LAYOUT = struct.Struct(f'>Bqqqq{ADDRESS_SIZE}s{ADDRESS_SIZE}s')
+
+
+def to_units(amount: float) -> int:
+    return round(amount * UNITS_PER_COIN)
+
+
+def from_units(units: int) -> float:
+    return units / UNITS_PER_COIN
+
 
 class Tx:
-    def __init__(self, input: float, output: float, fee: float, sender: rsa.RSAPublicKey, receiver: rsa.RSAPublicKey, type=NORMAL):
+    def __init__(self, input: float, output: float, fee: float, sender: PublicKey | bytes, receiver: PublicKey | bytes, type=NORMAL):
         self.type = type
-        self.sender = encode_public_key(sender)
-        self.receiver = encode_public_key(receiver)
-        self.input = input
-        self.output = output
-        self.fee = fee
+        self.sender = address_of(sender)
+        self.receiver = address_of(receiver)
+        # amounts are given in coins and kept as exact base units
+        self.input = to_units(input)
+        self.output = to_units(output)
+        self.fee = to_units(fee)
         self.sig = None
         self.hash = None
-        self.created_at = datetime.now().strftime(r'%m/%d/%Y %I:%M:%S.%f')
+        self.created_at = time_ns()
+        self.__hash_check = None
+        self.__legacy_amounts = None
 
-    def sign(self, private: rsa.RSAPrivateKey):
+    def sign(self, private: PrivateKey):
+        # a tx whose fields cannot be encoded stays unsigned, so it is never valid
         self.hash = self.compute_hash()
-        self.sig = sign(self.hash, private)
+        self.sig = sign(self.hash, private) if self.hash is not None else None
+
+    def __getstate__(self) -> dict:
+        # the hash check is only valid for this process
+        state = self.__dict__.copy()
+        state['_Tx__hash_check'] = None
+        return state
+
+    def __setstate__(self, state: dict):
+        state.setdefault('_Tx__hash_check', None)
+        # txs stored before addresses carry the full PEM keys
+        state['sender'] = address_of(state['sender'])
+        state['receiver'] = address_of(state['receiver'])
+        if '_Tx__legacy_amounts' not in state:
+            # txs stored before base units carry their amounts in coins
+            amounts = (state['input'], state['output'], state['fee'])
+            state['input'], state['output'], state['fee'] = map(to_units, amounts)
+            # the legacy hash covers the amounts as they were written
+            state['_Tx__legacy_amounts'] = tuple(map(str, amounts)) if isinstance(state['created_at'], str) else None
+        self.__dict__.update(state)
 
     def hash_is_valid(self) -> bool:
-        return self.hash is None or self.hash == self.compute_hash()
+        # only re-hash when a hashed field changed since the last check
+        if self.hash is None:
+            return True
+        key = self.__hash_key()
+        if self.__hash_check is None or self.__hash_check[0] != key:
+            self.__hash_check = (key, self.verify_hash())
+        return self.__hash_check[1]
+
+    def verify_hash(self) -> bool:
+        return self.hash == self.compute_hash()
 
-    def signed_by(self, pub_key: bytes) -> bool:
-        return self.sig is not None and verify(self.hash, self.sig, decode_public_key(pub_key))
+    def __hash_key(self) -> tuple:
+        return (self.hash, self.type, self.input, self.output, self.fee, self.sender, self.receiver, self.created_at)
+
+    def signed_by(self, sender_addr: bytes) -> bool:
+        return self.sig is not None and verify_by_address(self.hash, self.sig, sender_addr)
 
     def sent_by(self, sender_addr: bytes) -> bool:
-        return sender_addr == self.sender
+        return address_of(sender_addr) == self.sender
 
-    def get_input(self) -> float:
+    def get_input(self) -> int:
         return self.input
 
-    def get_output(self) -> float:
+    def get_output(self) -> int:
         return self.output
 
-    def get_fee(self) -> float:
+    def get_fee(self) -> int:
         return self.fee
 
     def valid_input_output(self) -> bool:
-        return self.input > 0.0 and self.output > 0.0 and self.fee >= 0.0 and isclose(self.input, fsum((self.output, self.fee)))
+        return (0 < self.input <= MAX_UNITS and 0 < self.output <= MAX_UNITS and 0 <= self.fee <= MAX_UNITS
+                and self.input == self.output + self.fee)
 
     def is_valid(self) -> bool:
         if self.type == REWARD:
             # REWARD txs are valid if they are signed by the validator and have the correct value
-            return (self.input == self.output == REWARD_VALUE) and self.fee == 0.0 and self.hash_is_valid() and self.signed_by(self.sender)
+            return (self.input == self.output == REWARD_UNITS) and self.fee == 0 and self.hash_is_valid() and self.signed_by(self.sender)
         else:
             # NORMAL txs are valid if they are signed by the sender and have the correct value
             return self.hash_is_valid() and self.signed_by(self.sender) and self.valid_input_output()
 
-    def compute_hash(self) -> bytes:
+    def encode(self) -> bytes:
+        # canonical fixed layout encoding, the same on every node
+        return TX_LAYOUT.pack(self.type,
+                              self.input,
+                              self.output,
+                              self.fee,
+                              self.created_at,
+                              self.sender,
+                              self.receiver
+                              )
+
+    def compute_hash(self) -> bytes | None:
+        if isinstance(self.created_at, str):
+            # txs created before the binary encoding keep their original hash
+            return self.__compute_legacy_hash()
+        try:
+            return hashlib.sha256(self.encode()).digest()
+        except struct.error:
+            # a field does not fit the layout, such a tx has no hash and never matches a stored one
+            return None
+
+    def get_created_at(self) -> datetime:
+        if isinstance(self.created_at, str):
+            return datetime.strptime(self.created_at, r'%m/%d/%Y %I:%M:%S.%f')
+        return datetime.fromtimestamp(self.created_at / 1e9)
+
+    def __compute_legacy_hash(self) -> bytes:
         digest = hashes.Hash(hashes.SHA256(), backend=default_backend())
         digest.update(bytes(str(self.type), 'utf8'))
-        digest.update(bytes(str(self.input), 'utf8'))
-        digest.update(bytes(str(self.output), 'utf8'))
-        digest.update(bytes(str(self.fee), 'utf8'))
-        digest.update(self.sender)
-        digest.update(self.receiver)
+        for amount in self.__legacy_amount_strings():
+            digest.update(bytes(amount, 'utf8'))
+        # the legacy hash covers the full keys, which are resolved from the key directory
+        digest.update(key_directory.resolve(self.sender) or self.sender)
+        digest.update(key_directory.resolve(self.receiver) or self.receiver)
         digest.update(bytes(str(self.created_at), 'utf8'))
         return digest.finalize()
 
+    def __legacy_amount_strings(self) -> list[str]:
+        # amounts are hashed as written in coins, unless they changed since loading
+        written = self.__legacy_amounts or (None, None, None)
+        return [amount if amount is not None and to_units(float(amount)) == units else str(from_units(units))
+                for amount, units in zip(written, (self.input, self.output, self.fee))]
+
+    def legacy_repr(self) -> str:
+        # the repr the string hash of legacy blocks covers, amounts as written and full keys
+        type_string = "REWARD" if self.type == REWARD else "NORMAL"
+        input, output, fee = self.__legacy_amount_strings()
+        sender = key_directory.resolve(self.sender) or self.sender
+        receiver = key_directory.resolve(self.receiver) or self.receiver
+        return f"{type_string} | {input} from {sender.hex()} | {output} to {receiver.hex()} & {fee} fee"
+
     def __eq__(self, other: Tx) -> bool:
         return self.hash and other and self.hash == other.hash
 
     def __repr__(self) -> str:
         type_string = "REWARD" if self.type == REWARD else "NORMAL"
-        return f"{type_string} | {self.input} from {self.sender.hex()} | {self.output} to {self.receiver.hex()} & {self.fee} fee"
+        return f"{type_string} | {from_units(self.input)} from {self.sender.hex()} | {from_units(self.output)} to {self.receiver.hex()} & {from_units(self.fee)} fee"
+
@@ -1,7 +1,11 @@
 from __future__ import annotations
 import hashlib
+import threading
+from time import monotonic
 from src.Signature import *
 
+SESSION_IDLE_TIMEOUT = 15 * 60  # seconds before unlocked keys are dropped
+
 
 class User:
     def __init__(self, username: str, password: str, encoded_keys: tuple[bytes, bytes]):
@@ -9,21 +13,90 @@ class User:
         self.password = self.__password_hash(password)
         self.private_key, self.public_key = encoded_keys
 
+    @staticmethod
+    def from_record(username: str, password: bytes, private_key: bytes, public_key: bytes) -> User:
+        # a stored user, whose password is already hashed
+        user = User.__new__(User)
+        user.username, user.password = username, password
+        user.private_key, user.public_key = private_key, public_key
+        return user
+
     def __password_hash(self, password: str) -> bytes:
         return hashlib.sha256(bytes(self.username + password, 'utf8')).digest()
 
     def authorize(self, password: str) -> bool:
         return self.password == self.__password_hash(password)
 
-    def get_rsa_keys(self, password: str) -> tuple[rsa.RSAPrivateKey, rsa.RSAPublicKey]:
+    def get_rsa_keys(self, password: str) -> tuple[PrivateKey, PublicKey]:
         if self.authorize(password):
             return decode_keys((self.private_key, self.public_key), password)
 
-    def get_public_key(self) -> rsa.RSAPublicKey:
+    def get_public_key(self) -> PublicKey:
         return decode_public_key(self.public_key)
 
+    def get_address(self) -> bytes:
+        return address_of(self.public_key)
+
     def __eq__(self, other: User) -> bool:
         return self.username == other.username and self.public_key == other.public_key and self.private_key == other.private_key
 
     def __repr__(self) -> str:
         return f"User {self.username} | Public Key: {self.public_key}"
+
+
+# Holds the decrypted keys of a logged in user, so the key derivation only runs once per session
+# The keys are dropped after the idle timeout and on logout
+class KeySession:
+    def __init__(self, user: User, idle_timeout: float = SESSION_IDLE_TIMEOUT):
+        self.user = user
+        self.idle_timeout = idle_timeout
+        self.keys: tuple[PrivateKey, PublicKey] | None = None
+        self.last_used = 0.0
+        self.expiry: threading.Timer | None = None
+        self.lock = threading.Lock()
+
+    def unlock(self, password: str) -> tuple[PrivateKey, PublicKey] | None:
+        if not self.user.authorize(password):
+            return None
+        with self.lock:
+            if self.__holds_keys():
+                self.__touch()
+                return self.keys
+        keys = self.user.get_rsa_keys(password)
+        with self.lock:
+            self.keys = keys
+            self.__touch()
+        return keys
+
+    def is_unlocked(self) -> bool:
+        with self.lock:
+            return self.__holds_keys()
+
+    def __holds_keys(self) -> bool:
+        # idle keys are dropped as soon as the timeout is noticed, not kept until the next unlock
+        if self.keys is not None and monotonic() - self.last_used > self.idle_timeout:
+            self.keys = None
+        return self.keys is not None
+
+    def __touch(self):
+        # every use restarts the timer that drops the keys once the session is idle
+        self.last_used = monotonic()
+        if self.expiry is not None:
+            self.expiry.cancel()
+        self.expiry = threading.Timer(self.idle_timeout, self.__expire, args=(self.last_used,))
+        self.expiry.daemon = True
+        self.expiry.start()
+
+    def __expire(self, last_used: float):
+        with self.lock:
+            # an unlock since the timer started keeps the keys
+            if self.last_used == last_used:
+                self.keys = None
+                self.expiry = None
+
+    def close(self):
+        with self.lock:
+            if self.expiry is not None:
+                self.expiry.cancel()
+                self.expiry = None
+            self.keys = None
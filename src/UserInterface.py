@@ -505,9 +505,17 @@ class MineBlockWindow(ttk.Toplevel):
                                        bootstyle=INFO
                                        )
 
+        self.cancel_button = ttk.Button(container,
+                                        text='CANCEL',
+                                        command=self.cancel_task,
+                                        bootstyle=DANGER,
+                                        state=DISABLED
+                                        )
+
         self.progressbar = ttk.Floodgauge(container,
                                           bootstyle=INFO,
-                                          mode=INDETERMINATE
+                                          mode=DETERMINATE,
+                                          maximum=100
                                           )
 
         self.message_label = ttk.Label(container,
@@ -531,9 +539,11 @@ class MineBlockWindow(ttk.Toplevel):
                                       sticky=(W)
                                       )
         self.start_button.grid(row=3, column=0,
-                               columnspan=2,
                                sticky=(N, E, S, W)
                                )
+        self.cancel_button.grid(row=3, column=1,
+                                sticky=(N, E, S, W)
+                                )
         self.progressbar.grid(row=4, column=0,
                               columnspan=2,
                               sticky=(N, E, S, W)
@@ -555,38 +565,53 @@ class MineBlockWindow(ttk.Toplevel):
     def start_task(self):
         """Start the progressbar and run the task in another thread"""
         self.start_button.configure(state=DISABLED)
-        self.progressbar.configure(bootstyle=SUCCESS)
-        self.progressbar.start()
+        self.cancel_button.configure(state=NORMAL)
+        self.progressbar.configure(bootstyle=SUCCESS, value=0)
 
         thread = MiningThread(self.node, self.password.get())
         thread.start()
 
         self.listen_for_complete_task(thread)
 
+    def cancel_task(self):
+        """Stop the running mining job, the block stays ready to mine"""
+        self.cancel_button.configure(state=DISABLED)
+        self.node.cancel_mining()
+
     def listen_for_complete_task(self, thread: MiningThread):
         """Check to see if task is complete; if so, stop the 
         progressbar and show and alert
         """
         if not thread.is_alive():
-            self.progressbar.stop()
+            self.cancel_button.configure(state=DISABLED)
             result = thread.join()
             if result == NodeActionResult.SUCCESS:
                 self.message.set('Block successfully mined')
                 self.message_label.configure(bootstyle=SUCCESS)
-                self.progressbar.configure(bootstyle=SUCCESS)
+                self.progressbar.configure(bootstyle=SUCCESS, value=100)
                 self.master.master.update_all_windows()
                 self.after(2000, self.destroy)
             elif result == NodeActionResult.FAIL:
                 self.message.set('Mining attempt failed')
                 self.progressbar.configure(bootstyle=DANGER)
                 self.start_button.configure(state=NORMAL)
+            elif result == NodeActionResult.CANCELLED:
+                self.message.set('Mining attempt cancelled')
+                self.progressbar.configure(bootstyle=WARNING, value=0)
+                self.master.master.update_all_windows()
+                self.start_button.configure(state=NORMAL)
             else:
                 self.message.set('Mining attempt invalid')
                 self.progressbar.configure(bootstyle=WARNING)
                 self.start_button.configure(state=NORMAL)
         else:
-            self.message.set('Mining.. please wait..')
-            self.after(5000, lambda: self.listen_for_complete_task(thread))
+            stats = self.node.mining_stats.snapshot()
+            # the expected work is only an average, so hold the bar short of full until a nonce is found
+            self.progressbar.configure(value=min(99, int(stats.progress() * 100)))
+            eta = f"{stats.eta:.0f} s" if stats.eta is not None else "unknown"
+            self.message.set(f'Mining.. please wait..\n' +
+                             f'{stats.hash_rate / 1000:.1f} kH/s | {stats.elapsed:.0f} s elapsed | ETA {eta}')
+            self.after(500, lambda: self.listen_for_complete_task(thread))
 
 
 class ValidateBlockWindow(ttk.Toplevel):
@@ -717,7 +742,7 @@ class TxViewerWindow(ttk.Toplevel):
             self.tx_hash_label.pack()
 
         self.tx_created_at_label = ttk.Label(self,
-                                             text=f"Created At: {self.tx.created_at}",
+                                             text=f"Created At: {self.tx.get_created_at().strftime(r'%m/%d/%Y %I:%M:%S.%f')}",
                                              bootstyle=hash_style
                                              )
         self.tx_created_at_label.pack()
@@ -733,19 +758,19 @@ class TxViewerWindow(ttk.Toplevel):
         self.tx_type_label.pack()
 
         self.tx_input_label = ttk.Label(self,
-                                        text=f"Input: {self.tx.input}",
+                                        text=f"Input: {from_units(self.tx.input)}",
                                         bootstyle=tx_style
                                         )
         self.tx_input_label.pack()
 
         self.tx_output_label = ttk.Label(self,
-                                         text=f"Output: {self.tx.output}",
+                                         text=f"Output: {from_units(self.tx.output)}",
                                          bootstyle=tx_style
                                          )
         self.tx_output_label.pack()
 
         self.tx_fee_label = ttk.Label(self,
-                                      text=f"Fee: {self.tx.fee}",
+                                      text=f"Fee: {from_units(self.tx.fee)}",
                                       bootstyle=tx_style
                                       )
         self.tx_fee_label.pack()
@@ -1192,7 +1217,7 @@ class UserViewer(ttk.Labelframe):
 
     def show_public_key(self):
         Messagebox.ok(title="Public Key",
-                      message=f"Public Key: {self.user.public_key.hex()}")
+                      message=f"Address: {self.user.get_address().hex()}\n\nPublic Key: {self.user.public_key.hex()}")
 
     def show_private_key(self):
         Messagebox.ok(title="Private Key",
@@ -1218,18 +1243,18 @@ class UserViewer(ttk.Labelframe):
                                         justify=CENTER
                                         )
         self.balance_label = ttk.Label(self,
-                                       text=f"Balance: {self.user_wallet.available}",
+                                       text=f"Balance: {from_units(self.user_wallet.available)}",
                                        bootstyle=SUCCESS,
                                        font=("Courier New", 12)
                                        )
         self.res_balance_label = ttk.Label(self,
-                                           text=f"Reserved: {self.user_wallet.reserved}",
+                                           text=f"Reserved: {from_units(self.user_wallet.reserved)}",
                                            bootstyle=WARNING,
                                            font=("Courier New", 12)
                                            )
 
         self.tx_summary_label = ttk.Label(self,
-                                          text=f"[incoming: {self.user_wallet.incoming} | outgoing: {self.user_wallet.outgoing} | fees: {self.user_wallet.fees}]",
+                                          text=f"[incoming: {from_units(self.user_wallet.incoming)} | outgoing: {from_units(self.user_wallet.outgoing)} | fees: {from_units(self.user_wallet.fees)}]",
                                           bootstyle=PRIMARY,
                                           font=("Courier New", 10)
                                           )
@@ -1,10 +1,57 @@
 import unittest
+import hashlib
+import pickle
+from unittest import mock
 from time import sleep
 from BlockChain import *
 from Transaction import *
 from Signature import *
 
 
+def legacy_tx(private_key: PrivateKey, public_key: PublicKey, second: int) -> dict:
+    # a tx as pickled before addresses and base units, with a string timestamp
+    tx = Tx(1.1, 1.0, 0.1, public_key, public_key)
+    tx.created_at = f'01/02/2024 03:04:{second:02}.000006'
+    tx._Tx__legacy_amounts = ('1.1', '1.0', '0.1')
+    tx.sign(private_key)
+    state = tx.__getstate__()
+    del state['_Tx__legacy_amounts']
+    pem = encode_public_key(public_key)
+    state.update(input=1.1, output=1.0, fee=0.1, sender=pem, receiver=pem)
+    return state
+
+
+def legacy_block_state(private_key: PrivateKey, public_key: PublicKey, tx_states: list[dict], flags: list) -> dict:
+    # a block as pickled before the binary header, mined against its string hash
+    pem = encode_public_key(public_key)
+    txs = {state['hash'].hex(): state for state in tx_states}
+    txs_string = '{' + ', '.join(f"'{tx_hash}': NORMAL | 1.1 from {pem.hex()} | 1.0 to {pem.hex()} & 0.1 fee"
+                                 for tx_hash in txs) + '}'
+    state = {'txs': txs, 'previousBlock': None, 'previousHash': None, 'next_char_limit': 255, 'nonce': 0,
+             'hash': None, 'minted_at': time() - 600, 'mined_at': time() - 300, 'mined_by': pem, 'signature': None,
+             'validation_flags': flags, 'id': 0}
+    midstate = hashlib.sha256()
+    for field in ('id', 'txs', 'previousHash'):
+        midstate.update(bytes(txs_string if field == 'txs' else str(state[field]), 'utf8'))
+    while True:
+        digest = midstate.copy()
+        for field in ('nonce', 'next_char_limit', 'minted_at', 'mined_at'):
+            digest.update(bytes(str(state[field]), 'utf8'))
+        digest.update(pem)
+        if digest.digest().startswith(b'00'):
+            break
+        state['nonce'] += 1
+    state['hash'] = digest.digest()
+    state['signature'] = SCHEMES[RSA].sign(state['hash'], private_key)
+    return state
+
+
+def unpickle(cls: type, state: dict):
+    obj = cls.__new__(cls)
+    obj.__setstate__(state)
+    return obj
+
+
 class TestBlockChain(unittest.TestCase):
     def setUp(self):
         self.sender_private_key, self.sender_public_key = generate_keys()
@@ -73,7 +120,7 @@ class TestBlockChain(unittest.TestCase):
                  self.receiver_public_key)
         tx2.sign(self.sender_private_key)
         self.block.add_tx(tx2)
-        self.assertAlmostEqual(self.block.get_tx_fees(), 0.7)
+        self.assertEqual(self.block.get_tx_fees(), to_units(0.7))
         self.block.txs.clear()
 
         tx1 = Tx(10.1, 10.0, 0.1,
@@ -103,11 +150,11 @@ class TestBlockChain(unittest.TestCase):
                  self.other_public_key)
         tx2.sign(self.sender_private_key)
         self.block.add_tx(tx2)
-        self.assertEqual(self.block.get_txs_by_public_key(encode_public_key(self.receiver_public_key)),
+        self.assertEqual(self.block.get_txs_by_address(address_of(self.receiver_public_key)),
                          {tx1.hash.hex(): tx1})
-        self.assertEqual(self.block.get_txs_by_public_key(encode_public_key(self.other_public_key)),
+        self.assertEqual(self.block.get_txs_by_address(address_of(self.other_public_key)),
                          {tx2.hash.hex(): tx2})
-        self.assertEqual(self.block.get_txs_by_public_key(encode_public_key(self.sender_public_key)),
+        self.assertEqual(self.block.get_txs_by_address(address_of(self.sender_public_key)),
                          {tx1.hash.hex(): tx1, tx2.hash.hex(): tx2})
         self.block.txs.clear()
 
@@ -145,9 +192,9 @@ class TestBlockChain(unittest.TestCase):
 
         # count totals and check if block is balanced
         total_in, total_out, fee = self.block._CBlock__count_totals()
-        self.assertAlmostEqual(total_in, 5.5)
-        self.assertAlmostEqual(total_out, 5.0)
-        self.assertAlmostEqual(fee, 0.5)
+        self.assertEqual(total_in, to_units(5.5))
+        self.assertEqual(total_out, to_units(5.0))
+        self.assertEqual(fee, to_units(0.5))
         self.assertTrue(self.block._CBlock__is_balanced())
 
         # add reward tx
@@ -178,12 +225,12 @@ class TestBlockChain(unittest.TestCase):
         self.assertIsNotNone(self.block.mined_at)
         self.assertTrue(verify(self.block.hash,
                                self.block.signature,
-                               decode_public_key(self.block.mined_by)))
+                               resolve_public_key(self.block.mined_by)))
         self.assertTrue(verify(self.block.hash,
                                self.block.signature,
                                self.sender_public_key))
         self.assertEqual(self.block.mined_by,
-                         encode_public_key(self.sender_public_key))
+                         address_of(self.sender_public_key))
         self.assertEqual(block2.previousHash, self.block.compute_hash())
         self.assertTrue(block2.chain_is_valid())
         self.assertTrue(block2.block_is_valid())
@@ -267,7 +314,219 @@ class TestBlockChain(unittest.TestCase):
         self.assertIsNotNone(block2.hash)
         self.assertIsNotNone(block2.mined_at)
         self.assertEqual(block2.mined_by,
-                         encode_public_key(self.sender_public_key))
+                         address_of(self.sender_public_key))
+
+    def test_long_chain_is_valid(self):
+        # iterative validation does not hit the recursion limit
+        block = self.block
+        for i in range(3000):
+            block = CBlock(block)
+        self.assertTrue(block.chain_is_valid())
+
+        # tamper deep below the tip
+        self.block.minted_at += 1
+        self.assertFalse(block.chain_is_valid())
+
+    def test_tamper_below_watermark(self):
+        for i in range(5):
+            tx = Tx(1.1, 1.0, 0.1,
+                    self.sender_public_key,
+                    self.receiver_public_key
+                    )
+            tx.sign(self.sender_private_key)
+            self.block.add_tx(tx)
+        block2 = self.block.mine(self.sender_private_key,
+                                 self.sender_public_key)
+        self.assertTrue(block2.chain_is_valid())
+        self.assertEqual(self.block.watermark,
+                         (self.block.id, self.block.hash, self.block.signature))
+
+        # a replaced signature is verified again
+        signature = self.block.signature
+        self.block.signature = sign(self.block.hash, self.other_private_key)
+        self.assertFalse(block2.chain_is_valid())
+        self.block.signature = signature
+        self.assertTrue(block2.chain_is_valid())
+
+        # a successor minted before its predecessor was mined or in the future is rejected
+        minted_at = block2.minted_at
+        for timestamp in (self.block.mined_at - 1, time() + 3600):
+            block2.minted_at = timestamp
+            self.assertFalse(block2.chain_is_valid())
+        block2.minted_at = minted_at
+
+        # a changed header is hashed again
+        self.block.minted_at += 1
+        self.assertFalse(block2.chain_is_valid())
+        self.block.minted_at -= 1
+        self.assertTrue(block2.chain_is_valid())
+
+        # changed tx fields are caught below the tip, the merkle leaves are the stored tx hashes
+        tx = next(iter(self.block.txs.values()))
+        tx.input, tx.output = tx.input + 1, tx.output + 1
+        self.assertFalse(block2.chain_is_valid())
+        self.assertFalse(block2.block_is_valid())
+        tx.input, tx.output = tx.input - 1, tx.output - 1
+        self.assertTrue(block2.chain_is_valid())
+
+        # a replaced tx changes the header hash
+        self.block.txs.popitem()
+        self.assertFalse(block2.chain_is_valid())
+
+    def test_predecessor_mined_ahead(self):
+        for i in range(5):
+            tx = Tx(1.1, 1.0, 0.1,
+                    self.sender_public_key,
+                    self.receiver_public_key
+                    )
+            tx.sign(self.sender_private_key)
+            self.block.add_tx(tx)
+        # the miner's clock runs a minute ahead of ours
+        with mock.patch('BlockChain.time', return_value=time() + 60):
+            self.block.mine(self.sender_private_key, self.sender_public_key)
+
+        # a successor built here is minted after its predecessor was mined
+        successor = CBlock(self.block)
+        self.assertGreaterEqual(successor.minted_at, self.block.mined_at)
+        self.assertTrue(successor.chain_is_valid())
+
+    def test_state_cache_invalidation(self):
+        txs = []
+        for i in range(5):
+            tx = Tx(1.1, 1.0, 0.1,
+                    self.sender_public_key,
+                    self.receiver_public_key
+                    )
+            tx.sign(self.sender_private_key)
+            txs.append(tx)
+
+        for tx in txs[:4]:
+            self.block.add_tx(tx)
+        self.assertEqual(self.block.state(), BlockState.NEW)
+        self.block.add_tx(txs[4])
+        self.assertEqual(self.block.state(), BlockState.READY)
+        self.block.pop_tx_by_hash(txs[0].hash.hex())
+        self.assertEqual(self.block.state(), BlockState.NEW)
+        self.block.add_tx(txs[0])
+        self.assertEqual(self.block.state(), BlockState.READY)
+
+        self.block.mine(self.sender_private_key, self.sender_public_key)
+        self.assertEqual(self.block.state(), BlockState.MINED)
+        for private_key, public_key in ((self.receiver_private_key, self.receiver_public_key),
+                                        (self.other_private_key, self.other_public_key)):
+            self.block.validate_block(private_key, public_key)
+            self.assertEqual(self.block.state(), BlockState.MINED)
+        private_key, public_key = generate_keys()
+        self.block.validate_block(private_key, public_key)
+        self.assertEqual(self.block.state(), BlockState.VALIDATED)
+
+    def test_unpickle_without_state_cache(self):
+        state = self.block.__getstate__()
+        del state['_CBlock__revision'], state['_CBlock__state_cache']
+        block = CBlock.__new__(CBlock)
+        block.__setstate__(state)
+        self.assertEqual(block.state(), BlockState.NEW)
+        block.invalidate_state()
+
+    def test_legacy_block_keeps_hash(self):
+        private_key, public_key = generate_keys(RSA)
+        validator_private_key, validator_public_key = generate_keys(RSA)
+        tx_states = [legacy_tx(private_key, public_key, second) for second in range(5)]
+        state = legacy_block_state(private_key, public_key, tx_states, [])
+        flag = (SCHEMES[RSA].sign(state['hash'], validator_private_key), encode_public_key(validator_public_key))
+        state['validation_flags'].append(flag)
+        state['txs'] = {tx_hash: unpickle(Tx, tx_state) for tx_hash, tx_state in state['txs'].items()}
+
+        block = unpickle(CBlock, state)
+        self.assertEqual(block.version, LEGACY_VERSION)
+        self.assertEqual(block.mined_by, address_of(public_key))
+        self.assertEqual(block.validation_flags, [(flag[0], address_of(validator_public_key))])
+        self.assertEqual(len(block.txs), 5)
+        self.assertEqual(block.compute_hash(), block.hash)
+        self.assertTrue(block.block_is_valid())
+
+        # a current block is mined on top of it with the initial target
+        successor = CBlock(block)
+        self.assertEqual(successor.previousHash, block.hash)
+        self.assertEqual(successor.target, INITIAL_TARGET)
+        self.assertTrue(successor.chain_is_valid())
+
+        loaded = pickle.loads(pickle.dumps(block))
+        self.assertEqual(loaded.version, LEGACY_VERSION)
+        self.assertTrue(loaded.chain_is_valid())
+        loaded.minted_at += 1
+        self.assertFalse(loaded.chain_is_valid())
+
+        # an unmined legacy block is mined as a current one
+        state = legacy_block_state(private_key, public_key, [], [])
+        state.update(hash=None, mined_at=None, mined_by=None, signature=None)
+        head = unpickle(CBlock, state)
+        self.assertEqual((head.version, head.target), (BLOCK_VERSION, INITIAL_TARGET))
+
+    def test_tx_proof(self):
+        txs = []
+        for i in range(5):
+            tx = Tx(1.1, 1.0, 0.1,
+                    self.sender_public_key,
+                    self.receiver_public_key
+                    )
+            tx.sign(self.sender_private_key)
+            self.block.add_tx(tx)
+            txs.append(tx)
+        self.block.mine(self.sender_private_key, self.sender_public_key)
+        self.assertEqual(self.block.merkle_root,
+                         self.block.compute_merkle_root())
+
+        for tx in txs:
+            proof = self.block.tx_proof(tx.hash.hex())
+            self.assertTrue(CBlock.verify_tx_proof(tx.hash.hex(),
+                                                   proof,
+                                                   self.block.merkle_root))
+        self.assertIsNone(self.block.tx_proof('unknown'))
+
+        # the stored root must match the txs
+        self.block.merkle_root = bytes(32)
+        self.assertFalse(self.block.block_is_valid())
+
+    def test_retarget(self):
+        for mining_time, factor, divisor in ((60.0, 4, 1), (15.0, 1, 1), (1.0, 1, 4)):
+            block = CBlock()
+            block.mined_at = block.minted_at
+            for i in range(RETARGET_WINDOW):
+                block = CBlock(block)
+                block.minted_at = block.previousBlock.mined_at + mining_time
+                block.mined_at = block.minted_at
+                if block.id % RETARGET_WINDOW != 0:
+                    self.assertEqual(block.target, INITIAL_TARGET)
+            self.assertEqual(block.id % RETARGET_WINDOW, 0)
+            self.assertEqual(block.expected_target(),
+                             INITIAL_TARGET * factor // divisor)
+
+    def test_cancel_mining_job(self):
+        for i in range(5):
+            tx = Tx(1.1, 1.0, 0.1,
+                    self.sender_public_key,
+                    self.receiver_public_key
+                    )
+            tx.sign(self.sender_private_key)
+            self.block.add_tx(tx)
+        self.assertEqual(self.block.state(), BlockState.READY)
+
+        # a cancelled job leaves the block ready to mine again
+        job = MiningJob(self.block, 1)
+        job.cancel()
+        self.assertIsNone(job.run(self.sender_private_key,
+                                  self.sender_public_key))
+        self.assertTrue(job.is_cancelled())
+        self.assertEqual(self.block.state(), BlockState.READY)
+        self.assertIsNone(self.block.mined_by)
+        self.assertIsNone(self.block.hash)
+
+        job = MiningJob(self.block, 1)
+        new = job.run(self.sender_private_key, self.sender_public_key)
+        self.assertFalse(job.is_cancelled())
+        self.assertIs(new.previousBlock, self.block)
+        self.assertEqual(self.block.state(), BlockState.MINED)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,117 @@
+import unittest
+import tempfile
+from pathlib import Path
+from typing import NamedTuple
+from BlockLog import *
+
+
+class Header(NamedTuple):
+    id: int
+    hash: bytes
+
+
+def block(height: int, tag: int = 0) -> tuple:
+    return (BLOCK_RECORD, Header(height, bytes([height + 1, tag]) * 16))
+
+
+def head(height: int, body: str = 'body') -> tuple:
+    return (HEAD_RECORD, Header(height, None), body)
+
+
+class TestBlockLog(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.log = BlockLog(Path(self.directory.name), segment_size=128)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_append_and_read(self):
+        empty = self.log.root()
+        root = self.log.append([block(0), block(1)])
+        self.assertNotEqual(root, empty)
+        self.assertEqual(self.log.append([]), root)
+        for _ in range(4):
+            root = self.log.append([head(2)])
+
+        # small segments roll over and the manifest is read back by a new log
+        log = BlockLog(Path(self.directory.name), segment_size=128)
+        self.assertEqual(log.root(), root)
+        self.assertGreater(len(log.segments), 1)
+        self.assertEqual(log.read(root), [block(0), block(1)] + [head(2)] * 4)
+        self.assertTrue(log.verify(root))
+        self.assertIsNone(log.read(empty))
+
+        # appends keep going on the last segment without re-reading the others
+        root = log.append([block(2)])
+        self.assertEqual(self.log.root(), self.log.root_of(self.log.segments, self.log.index_checksum))
+        self.assertEqual(log.read(root)[-1], block(2))
+
+    def test_index(self):
+        self.log.append([block(0), block(1), head(2)])
+        for _ in range(4):
+            self.log.append([head(2)])
+        self.assertEqual(self.log.indexed_records(), ([block(0), block(1)], head(2)))
+
+        # a replaced block drops every block above it from the index
+        self.log.append([block(0, 1), head(1)])
+        self.assertEqual(self.log.indexed_records(), ([block(0, 1)], head(1)))
+
+    def test_tampered_index(self):
+        self.log.append([block(0), head(1, 'old')])
+        root = self.log.append([head(1, 'new')])
+        # point the head slot back at the older head record
+        log = BlockLog(Path(self.directory.name), segment_size=128)
+        self.assertTrue(log.matches(root))
+        with open(log.segment_path(log.segments[0].name), "rb") as f:
+            offset, length, record = list(iter_records(f.read()))[1]
+        self.assertEqual(record, head(1, 'old'))
+        index = bytearray(log.index_path().read_bytes())
+        INDEX_ENTRY.pack_into(index, 0, 0, offset, length, bytes(32))
+        log.index_path().write_bytes(bytes(index))
+
+        # the index is covered by the root, so it is rebuilt from the segments
+        self.assertTrue(log.matches(root))
+        self.assertEqual(log.indexed_records(), ([block(0)], head(1, 'new')))
+        self.assertTrue(log.verify(root))
+        self.assertEqual(log.append([]), root)
+
+    def test_tampered_segment(self):
+        root = self.log.append([block(0)])
+        path = self.log.segment_path(self.log.segments[0].name)
+        data = bytearray(path.read_bytes())
+        data[-1] ^= 0xff
+        path.write_bytes(bytes(data))
+        self.assertIsNone(self.log.read(root))
+        self.assertFalse(self.log.verify(root))
+
+    def test_segments_verified_on_read(self):
+        root = self.log.append([block(0), block(1)])
+        self.log.append([head(2)])
+        root = self.log.root()
+        log = BlockLog(Path(self.directory.name), segment_size=128)
+        self.assertTrue(log.matches(root))
+        self.assertEqual(log.verified, {})
+
+        path = log.segment_path(log.segments[-1].name)
+        data = bytearray(path.read_bytes())
+        data[-1] ^= 0xff
+        path.write_bytes(bytes(data))
+        # the manifest still matches, the tampered segment is caught once it is read
+        self.assertTrue(log.matches(root))
+        self.assertFalse(log.verify(root))
+        self.assertIsNone(log.indexed_records())
+        # and is never extended
+        self.assertRaises(ValueError, log.append, [head(2)])
+        self.assertEqual(log.root(), root)
+
+    def test_reset(self):
+        self.log.append([block(0)])
+        self.log.reset()
+        self.assertEqual(self.log.segments, [])
+        self.assertEqual(self.log.read(self.log.root()), [])
+        self.assertIsNone(self.log.indexed_records())
+
+
+if __name__ == '__main__':
+    unittest.main()
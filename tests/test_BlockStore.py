@@ -0,0 +1,51 @@
+import unittest
+import pickle
+import tempfile
+from pathlib import Path
+from BlockStore import *
+
+
+class TestBodyStore(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = BodyStore(Path(self.directory.name), maxsize=2)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_save_and_load(self):
+        digests = [self.store.save(bytes([i]) * 32, {'body': i}) for i in range(3)]
+
+        # only the most recent bodies stay in memory
+        self.assertFalse(self.store.is_cached(bytes([0]) * 32))
+        self.assertTrue(self.store.is_cached(bytes([2]) * 32))
+
+        # evicted bodies are loaded from disk again
+        self.assertEqual(self.store.load(bytes([0]) * 32, digests[0]), {'body': 0})
+        self.assertTrue(self.store.is_cached(bytes([0]) * 32))
+        self.assertIsNone(self.store.load(bytes([9]) * 32, digests[0]))
+        self.assertIsNone(self.store.load(bytes([0]) * 32, None))
+
+        # a body that does not match its digest is refused
+        self.assertIsNone(self.store.load(bytes([0]) * 32, digests[1]))
+        self.store.path(bytes([1]) * 32, digests[1]).write_bytes(pickle.dumps({'body': 9}))
+        self.store.bodies.clear()
+        self.assertIsNone(self.store.load(bytes([1]) * 32, digests[1]))
+
+    def test_body_versions(self):
+        block_hash = bytes(32)
+        first = self.store.save(block_hash, {'flags': []})
+        second = self.store.save(block_hash, {'flags': [1]})
+        self.store.bodies.clear()
+
+        # every version keeps its own file until it is removed
+        self.assertEqual(self.store.load(block_hash, first), {'flags': []})
+        self.assertEqual(self.store.load(block_hash, second), {'flags': [1]})
+        self.store.remove(block_hash, first)
+        self.store.bodies.clear()
+        self.assertIsNone(self.store.load(block_hash, first))
+        self.assertEqual(self.store.load(block_hash, second), {'flags': [1]})
+        self.assertEqual(list(Path(self.directory.name).glob("*.tmp")), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,13 +1,41 @@
 import unittest
+import tempfile
+from unittest import mock
 from unittest.mock import MagicMock
 from Node import Node
 from Data import *
 from Transaction import Tx, NORMAL, REWARD, REWARD_VALUE
-from Signature import generate_keys
+from Signature import generate_keys, RSA
+from src.BlockStore import body_store
+from test_BlockChain import legacy_tx, legacy_block_state
+import src.BlockChain
+import src.Data
+import src.Transaction
+
+
+class Pickled:
+    # pickles as an instance of cls with the given state, the way older versions of cls were pickled
+    def __init__(self, cls: type, state: dict):
+        self.cls = cls
+        self.state = state
+
+    def __reduce__(self):
+        return self.cls.__new__, (self.cls,), self.state
 
 
 class TestPool(unittest.TestCase):
     def setUp(self):
+        # every file the node writes goes to a temporary data directory
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        data = Path(directory.name)
+        for patcher in (mock.patch('src.BlockStore.DATA_DIRECTORY', data),
+                        mock.patch.object(block_log, 'directory', data / "ledger"),
+                        mock.patch.object(body_store, 'directory', data / "blocks"),
+                        mock.patch.object(pool_log, 'directory', data / "pool")):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(pool_log.close)
         self.node = Node()
         self.private_key, self.public_key = generate_keys()
         self.public_adress = encode_public_key(self.public_key)
@@ -50,6 +78,219 @@ class TestPool(unittest.TestCase):
 
         self.node.save_all()
 
+    def test_accounts_database(self):
+        with tempfile.TemporaryDirectory() as directory:
+            accounts = Accounts(Path(directory) / "database.db")
+            empty = accounts.save()
+            user = User("alice", "secret", encode_keys((self.private_key, self.public_key), "secret"))
+            self.assertTrue(accounts.add_user(user))
+            self.assertNotEqual(accounts.save(), empty)
+            # usernames and keys are unique
+            self.assertFalse(accounts.add_user(user))
+            self.assertFalse(accounts.add_user(User("bob", "secret", (user.private_key, user.public_key))))
+
+            self.assertEqual(accounts.get_user("alice"), user)
+            self.assertTrue(accounts.get_user("alice").authorize("secret"))
+            self.assertEqual(accounts.get_user_by_address(user.get_address()), user)
+            self.assertIsNone(accounts.get_user_by_address(bytes(32)))
+            self.assertEqual(accounts.usernames(), ["alice"])
+
+            # the hash is rebuilt from the stored users
+            reopened = Accounts(Path(directory) / "database.db")
+            self.assertEqual(reopened.save(), accounts.save())
+            reopened.reset([])
+            self.assertEqual(reopened.save(), empty)
+            accounts.connection.close()
+            reopened.connection.close()
+
+    def test_pool_appends_to_log(self):
+        self.node.save_pool()
+        size = pool_log.wal_path(pool_log.generation).stat().st_size
+        tx = Tx(1.1, 1.0, 0.1, self.public_key, self.public_key)
+        tx.sign(self.private_key)
+        self.node.pool.add_tx(tx)
+        self.node.save_pool()
+        # only the new tx is written
+        self.assertLess(pool_log.wal_path(pool_log.generation).stat().st_size - size, 1024)
+        self.assertIn(tx.hash.hex(), Pool.load(self.node.pool_hash).all_txs())
+
+        self.node.pool.pop_tx(tx.hash.hex())
+        self.node.save_pool()
+        self.assertNotIn(tx.hash.hex(), Pool.load(self.node.pool_hash).all_txs())
+        self.assertEqual(Pool.load(bytes(32)).all_txs(), {})
+
+    def test_ledger_keeps_headers_only(self):
+        block = self.node.ledger.get_current_block()
+        for i in range(5):
+            tx = Tx(1.1, 1.0, 0.1, self.public_key, self.public_key)
+            tx.sign(self.private_key)
+            block.add_tx(tx)
+        txs = block.all_txs()
+        mined = block
+        self.assertEqual(block.state(), BlockState.READY)
+        self.node.ledger.add_block(block.mine(self.private_key,
+                                              self.public_key))
+        self.assertIsNotNone(mined.hash)
+        self.node.save_ledger()
+
+        loaded_ledger = Ledger.load(self.node.ledger_hash)
+        loaded_block = loaded_ledger.get_block_by_id(mined.id)
+        self.assertEqual(loaded_block.header(), mined.header())
+        self.assertIs(loaded_ledger.get_block_by_hash(mined.hash), loaded_block)
+        self.assertEqual(loaded_block.all_txs().keys(), txs.keys())
+        self.assertTrue(loaded_ledger.get_current_block().block_is_valid())
+
+        # a flag changes the body, until its new digest is logged the logged version is loaded
+        logged_digest = mined.body_digest
+        validator_private_key, validator_public_key = generate_keys()
+        self.assertTrue(mined.validate_block(validator_private_key, validator_public_key))
+        body_store.bodies.clear()
+        loaded_block = Ledger.load(self.node.ledger_hash).get_block_by_id(mined.id)
+        self.assertEqual(loaded_block.all_txs().keys(), txs.keys())
+        self.assertEqual(len(loaded_block.validation_flags), 0)
+
+        # the new digest is logged with the header and the older version is removed
+        self.node.save_ledger()
+        self.assertFalse(body_store.path(mined.hash, logged_digest).exists())
+        loaded_block = Ledger.load(self.node.ledger_hash).get_block_by_id(mined.id)
+        self.assertEqual(len(loaded_block.validation_flags), 1)
+
+        # a body that no longer matches its header is refused
+        path = body_store.path(mined.hash, mined.body_digest)
+        body = pickle.loads(path.read_bytes())
+        body.validation_flags.clear()
+        path.write_bytes(pickle.dumps(body))
+        body_store.bodies.clear()
+        loaded_block = Ledger.load(self.node.ledger_hash).get_block_by_id(mined.id)
+        self.assertEqual(loaded_block.all_txs(), {})
+        self.assertFalse(loaded_block.block_is_valid())
+
+    def test_load_baseline_ledger(self):
+        # a ledger.dat written before the block log pickles the head, which holds the whole chain
+        private_key, public_key = generate_keys(RSA)
+        genesis = legacy_block_state(private_key, public_key,
+                                     [legacy_tx(private_key, public_key, second) for second in range(5)], [])
+        genesis['txs'] = {tx_hash: Pickled(src.Transaction.Tx, state) for tx_hash, state in genesis['txs'].items()}
+        head = {'txs': {}, 'previousBlock': Pickled(src.BlockChain.CBlock, genesis), 'previousHash': genesis['hash'],
+                'next_char_limit': 16, 'nonce': 2**255, 'hash': None, 'minted_at': genesis['mined_at'] + 1,
+                'mined_at': None, 'mined_by': None, 'signature': None, 'validation_flags': [], 'id': 1}
+        content = pickle.dumps(Pickled(src.Data.Ledger, {'head': Pickled(src.BlockChain.CBlock, head)}))
+        compose_relative_filepath("ledger.dat").write_bytes(content)
+
+        ledger = Ledger.load(content_hash(content))
+        self.assertEqual([block.hash for block in ledger.get_chain()], [genesis['hash'], None])
+        self.assertEqual(len(ledger.get_block_by_id(0).txs), 5)
+        self.assertIs(ledger.get_block_by_hash(genesis['hash']), ledger.get_block_by_id(0))
+        self.assertEqual(ledger.head.previousHash, genesis['hash'])
+        self.assertTrue(ledger.head.block_is_valid())
+        self.assertEqual(len(ledger.get_txs_by_address(address_of(public_key))), 5)
+
+        # the converted ledger moves to the block log and keeps its blocks
+        loaded_ledger = Ledger.load(ledger.save())
+        self.assertEqual([block.header() for block in loaded_ledger.get_chain()],
+                         [block.header() for block in ledger.get_chain()])
+        self.assertTrue(loaded_ledger.head.block_is_valid())
+
+    def test_ledger_index(self):
+        ledger = self.node.ledger
+        tx = Tx(1.1, 1.0, 0.1, self.public_key, self.public_key)
+        tx.sign(self.private_key)
+        ledger.get_current_block().add_tx(tx)
+        # txs of the head are found, but only mined blocks are indexed
+        self.assertEqual(ledger.find_tx(tx.hash.hex()), tx)
+        self.assertIsNone(ledger.get_tx_location(tx.hash.hex()))
+        self.assertIn(tx.hash.hex(), ledger.all_txs_from_chain())
+        self.assertEqual(ledger.index.block_hashes(), [block.hash for block in ledger.get_chain()[:-1]])
+
+        # the index entries are journaled with the blocks and loaded without reading any body
+        block = ledger.get_current_block()
+        for i in range(4):
+            tx = Tx(1.1, 1.0, 0.1, self.public_key, self.public_key)
+            tx.sign(self.private_key)
+            block.add_tx(tx)
+        ledger.add_block(block.mine(self.private_key, self.public_key))
+        self.assertEqual(ledger.get_tx_location(tx.hash.hex()), TxLocation(block.id, 4))
+        self.node.save_ledger()
+        body_store.bodies.clear()
+        loaded_ledger = Ledger.load(self.node.ledger_hash)
+        self.assertEqual(loaded_ledger.index.blocks, ledger.index.blocks)
+        self.assertEqual(loaded_ledger.index.tx_locations, ledger.index.tx_locations)
+        self.assertEqual(loaded_ledger.index.address_txs, ledger.index.address_txs)
+        self.assertFalse(any(body_store.is_cached(block.hash) for block in loaded_ledger.get_chain()[:-1]))
+        self.assertEqual(Ledger.replay(block_log.read(self.node.ledger_hash), self.node.ledger_hash).index.blocks,
+                         ledger.index.blocks)
+
+    def test_ledger_by_height(self):
+        ledger = self.node.ledger
+        head = ledger.get_current_block()
+        self.assertIs(ledger.head, ledger.get_block_by_id(head.id))
+        self.assertEqual(ledger.get_blocks(), ledger.get_chain())
+        self.assertEqual(ledger.get_blocks(head.id), [head])
+        self.assertEqual(ledger.get_blocks(0, head.id), ledger.get_chain()[:-1])
+
+        # a pickled block leaves its chain behind
+        received = pickle.loads(pickle.dumps(head))
+        self.assertIsNone(received.previousBlock)
+        self.assertEqual(received.previousHash, head.previousHash)
+
+        # and a pickled ledger is rebuilt by height
+        copy = pickle.loads(pickle.dumps(ledger))
+        self.assertEqual([block.hash for block in copy.get_chain()], [block.hash for block in ledger.get_chain()])
+        self.assertEqual(copy.head.header(), head.header())
+
+    def test_saved_hash_matches_file(self):
+        data = {'txs': list(range(100))}
+        saved_hash = save_and_return_hash("test_hash.dat", data)
+        path = compose_relative_filepath("test_hash.dat")
+        self.assertEqual(saved_hash, file_hash(path))
+        self.assertEqual(load_if_valid("test_hash.dat", saved_hash), data)
+        self.assertIsNone(load_if_valid("test_hash.dat", bytes(32)))
+        path.unlink()
+
+    def test_ledger_appends_to_block_log(self):
+        self.node.save_ledger()
+        root = self.node.ledger_hash
+        self.assertEqual(root, block_log.root())
+        # an unchanged ledger appends nothing
+        size = sum(segment.size for segment in block_log.segments)
+        self.node.save_ledger()
+        self.assertEqual(self.node.ledger_hash, root)
+        self.assertEqual(sum(segment.size for segment in block_log.segments), size)
+
+        # a change to the head only journals the head
+        tx = Tx(1.1, 1.0, 0.1, self.public_key, self.public_key)
+        tx.sign(self.private_key)
+        self.node.ledger.get_current_block().add_tx(tx)
+        self.node.save_ledger()
+        root = self.node.ledger_hash
+        self.assertGreater(sum(segment.size for segment in block_log.segments), size)
+
+        loaded_ledger = Ledger.load(root)
+        self.assertEqual(loaded_ledger.get_current_block().header(),
+                         self.node.ledger.get_current_block().header())
+        self.assertIn(tx.hash.hex(), loaded_ledger.get_current_block().all_txs())
+        self.assertEqual([block.hash for block in loaded_ledger.get_chain()],
+                         [block.hash for block in self.node.ledger.get_chain()])
+
+        # blocks are found by height without walking the chain
+        head = loaded_ledger.get_current_block()
+        self.assertIs(loaded_ledger.get_block_by_id(head.id), head)
+        self.assertIsNone(loaded_ledger.get_block_by_id(head.id + 1))
+        self.assertIsNone(loaded_ledger.get_block_by_id(-1))
+        self.assertEqual([loaded_ledger.get_block_by_id(i) for i in range(head.id + 1)],
+                         loaded_ledger.get_chain())
+
+        # an index pointing at an older head record is not trusted
+        self.node.ledger.get_current_block().pop_tx_by_hash(tx.hash.hex())
+        self.node.save_ledger()
+        stale = block_log.index_path().read_bytes()
+        self.node.ledger.get_current_block().add_tx(tx)
+        self.node.save_ledger()
+        block_log.index_path().write_bytes(stale)
+        loaded_ledger = Ledger.load(self.node.ledger_hash)
+        self.assertIn(tx.hash.hex(), loaded_ledger.get_current_block().all_txs())
+        self.assertNotEqual(block_log.index_path().read_bytes(), stale)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+from typing import NamedTuple
+from LedgerIndex import *
+
+
+class FakeTx(NamedTuple):
+    sender: bytes
+    receiver: bytes
+
+
+class FakeBlock(NamedTuple):
+    hash: bytes
+    mined_by: bytes
+    txs: dict
+
+
+ALICE = bytes([1]) * 32
+BOB = bytes([2]) * 32
+
+
+def block(height: int, tag: int = 0) -> FakeBlock:
+    txs = {f"tx-{height}-{tag}-{i}": FakeTx(ALICE, BOB if i % 2 else ALICE) for i in range(3)}
+    return FakeBlock(bytes([height, tag]) * 16, BOB, txs)
+
+
+class TestLedgerIndex(unittest.TestCase):
+    def test_lookups(self):
+        index = LedgerIndex()
+        blocks = [block(0), block(1)]
+        self.assertTrue(index.sync(blocks))
+        self.assertFalse(index.sync(blocks))
+        self.assertEqual(index.locate_tx("tx-1-0-2"), TxLocation(1, 2))
+        self.assertEqual(index.txs_of(BOB), ["tx-0-0-1", "tx-1-0-1"])
+        self.assertEqual(len(index.txs_of(ALICE)), 6)
+        self.assertEqual(index.blocks_mined_by(BOB), [0, 1])
+        self.assertEqual(index.blocks_mined_by(ALICE), [])
+
+    def test_replaced_blocks(self):
+        index = LedgerIndex()
+        index.sync([block(0), block(1), block(2)])
+        # a block replaced at height 1 drops every block above it
+        index.sync([block(0), block(1, 1)])
+        self.assertEqual(index.block_hashes(), [block(0).hash, block(1, 1).hash])
+        self.assertIsNone(index.locate_tx("tx-2-0-0"))
+        self.assertIsNone(index.locate_tx("tx-1-0-0"))
+        self.assertEqual(index.locate_tx("tx-1-1-0"), TxLocation(1, 0))
+        self.assertEqual(index.txs_of(BOB), ["tx-0-0-1", "tx-1-1-1"])
+        self.assertEqual(index.blocks_mined_by(BOB), [0, 1])
+
+        index.sync([])
+        self.assertEqual((index.tx_locations, index.address_txs, index.mined_blocks), ({}, {}, {}))
+
+    def test_duplicate_tx_hashes(self):
+        index = LedgerIndex()
+        repeated = FakeBlock(bytes([9]) * 32, BOB, dict(block(0).txs))
+        index.sync([block(0), repeated, block(2)])
+        self.assertEqual(index.locate_tx("tx-0-0-1"), TxLocation(0, 1))
+        self.assertEqual(index.locate_all("tx-0-0-1"), [TxLocation(0, 1), TxLocation(1, 1)])
+        self.assertEqual(index.txs_of(BOB), ["tx-0-0-1", "tx-0-0-1", "tx-2-0-1"])
+
+        # dropping the second copy keeps the first
+        index.sync([block(0)])
+        self.assertEqual(index.locate_all("tx-0-0-1"), [TxLocation(0, 1)])
+        self.assertEqual(index.txs_of(BOB), ["tx-0-0-1"])
+        self.assertEqual(index.blocks_mined_by(BOB), [0])
+        index.sync([])
+        self.assertEqual((index.tx_locations, index.address_txs, index.mined_blocks), ({}, {}, {}))
+
+
+if __name__ == '__main__':
+    unittest.main()
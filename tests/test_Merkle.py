@@ -0,0 +1,28 @@
+import unittest
+import hashlib
+from Merkle import *
+
+
+class TestMerkle(unittest.TestCase):
+    def setUp(self):
+        self.leaves = [hashlib.sha256(bytes([i])).digest() for i in range(7)]
+
+    def test_proofs_for_every_leaf(self):
+        root = merkle_root(self.leaves)
+        for index, leaf in enumerate(self.leaves):
+            proof = merkle_proof(self.leaves, index)
+            self.assertLessEqual(len(proof), 3)
+            self.assertTrue(verify_merkle_proof(leaf, proof, root))
+            self.assertFalse(verify_merkle_proof(
+                self.leaves[index - 1], proof, root))
+
+    def test_root_depends_on_every_leaf(self):
+        root = merkle_root(self.leaves)
+        self.assertNotEqual(merkle_root(self.leaves[:-1]), root)
+        self.assertNotEqual(merkle_root(list(reversed(self.leaves))), root)
+        self.assertEqual(merkle_root([self.leaves[0]]),
+                         hash_leaf(self.leaves[0]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -70,7 +70,7 @@ if __name__ == "__main__":
     if B2 is not B1 and B1.state() == BlockState.MINED:
         print("Success! Nonce accepted and Block Mined!")
         print(
-            f'Accepted Nonce = {str(B1.nonce)} next char limit: {B1.next_char_limit}\n B1 hash: {B1.compute_hash()}')
+            f'Accepted Nonce = {str(B1.nonce)} target: {B1.target:064x}\n B1 hash: {B1.compute_hash()}')
 
         print("elapsed time: " + str(elapsed) + " s.")
         if elapsed < MIN_MINING_TIME:
@@ -122,7 +122,7 @@ if __name__ == "__main__":
     if B3 is not B2 and B2.state() == BlockState.MINED:
         print("Success! Nonce accepted and Block Mined!")
         print(
-            f'Accepted Nonce = {str(B2.nonce)} next char limit: {B2.next_char_limit}\n B1 hash: {B2.compute_hash()}')
+            f'Accepted Nonce = {str(B2.nonce)} target: {B2.target:064x}\n B1 hash: {B2.compute_hash()}')
 
         print("elapsed time: " + str(elapsed) + " s.")
         if elapsed < MIN_MINING_TIME:
@@ -0,0 +1,56 @@
+import unittest
+import hashlib
+from Mining import *
+
+
+class TestMining(unittest.TestCase):
+    def test_search_nonce_matches_full_hash(self):
+        prefix = b'GoodChain header prefix'
+        nonce = search_nonce(prefix, 2**248, 0, 2**16)
+        self.assertIsNotNone(nonce)
+
+        digest = hashlib.sha256(prefix + encode_nonce(nonce)).digest()
+        self.assertTrue(meets_target(digest, 2**248))
+        self.assertFalse(meets_target(digest, 0))
+
+        # no earlier nonce in the searched range is accepted
+        self.assertIsNone(search_nonce(prefix, 2**248, 0, nonce))
+
+    def test_parallel_miner_finds_nonce(self):
+        prefix = b'GoodChain header prefix'
+        with ParallelMiner(2) as miner:
+            nonce = miner.search(prefix, 2**248, 0)
+        self.assertIsNotNone(nonce)
+        self.assertTrue(0 <= nonce < miner.batch_size())
+        self.assertTrue(meets_target(hashlib.sha256(
+            prefix + encode_nonce(nonce)).digest(), 2**248))
+
+    def test_parallel_miner_cancel(self):
+        cancel = Event()
+        cancel.set()
+        with ParallelMiner(2, cancel) as miner:
+            self.assertIsNone(miner.search(b'prefix', 0, 0))
+
+    def test_mining_stats(self):
+        stats = MiningStats()
+        self.assertFalse(stats.snapshot().running)
+
+        stats.start(4 * MINING_BATCH, 1)
+        with ParallelMiner(1, stats=stats) as miner:
+            self.assertIsNone(miner.search(b'prefix', 0, 0))
+        stats.stop()
+
+        snapshot = stats.snapshot()
+        self.assertFalse(snapshot.running)
+        self.assertEqual(snapshot.attempts, MINING_BATCH)
+        self.assertEqual(snapshot.progress(), 0.25)
+        self.assertGreater(snapshot.hash_rate, 0)
+        self.assertGreater(snapshot.eta, 0)
+
+    def test_next_nonce_wraps(self):
+        self.assertEqual(next_nonce(NONCE_SPACE - 1, 1), 0)
+        self.assertEqual(next_nonce(0, MINING_BATCH), MINING_BATCH)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import unittest
+import hashlib
+import tempfile
+from pathlib import Path
+from typing import NamedTuple
+from PoolLog import *
+
+
+class FakeTx(NamedTuple):
+    key: int
+    amount: int
+    hash: bytes
+    sig: bytes
+
+    def compute_hash(self) -> bytes:
+        return hashlib.sha256(bytes([self.key, self.amount])).digest()
+
+
+def tx(n: int) -> FakeTx:
+    return FakeTx(n, 1, bytes([n]) * 32, bytes([n, 1]))
+
+
+class TestPoolLog(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.log = PoolLog(Path(self.directory.name), sync_interval=0.01, compact_min_records=8)
+
+    def tearDown(self):
+        self.log.close()
+        self.directory.cleanup()
+
+    def test_append_and_load(self):
+        empty = self.log.digest()
+        digest = self.log.append([(ADD_RECORD, tx(1)), (ADD_RECORD, tx(2)), (REMOVE_RECORD, tx(1).hash.hex())])
+        self.assertNotEqual(digest, empty)
+        self.assertEqual(self.log.append([]), digest)
+
+        log = PoolLog(Path(self.directory.name))
+        txs, loaded = log.load()
+        self.assertEqual(loaded, digest)
+        self.assertEqual(txs, {tx(2).hash.hex(): tx(2)})
+
+        # the pool hash only depends on the pending txs
+        other = PoolLog(Path(self.directory.name) / "other")
+        self.assertEqual(other.append([(ADD_RECORD, tx(2))]), digest)
+        self.assertEqual(other.append([(REMOVE_RECORD, tx(2).hash.hex())]), empty)
+        other.close()
+        log.close()
+
+    def test_changed_fields(self):
+        digest = self.log.append([(ADD_RECORD, tx(1))])
+        # a tx whose amount changed but kept its stored hash and signature gives another pool hash
+        other = PoolLog(Path(self.directory.name) / "other")
+        self.assertNotEqual(other.append([(ADD_RECORD, tx(1)._replace(amount=2))]), digest)
+        other.close()
+
+    def test_compaction(self):
+        for n in range(12):
+            digest = self.log.append([(ADD_RECORD, tx(n)), (REMOVE_RECORD, tx(n).hash.hex())])
+        digest = self.log.append([(ADD_RECORD, tx(100))])
+        self.log.close()
+        # compaction leaves a snapshot and the logs written after it
+        self.assertTrue(self.log.snapshot_path().exists())
+        self.assertFalse(self.log.wal_path(0).exists())
+
+        log = PoolLog(Path(self.directory.name))
+        self.assertEqual(log.load(), ({tx(100).hash.hex(): tx(100)}, digest))
+        log.close()
+
+    def test_partial_record(self):
+        digest = self.log.append([(ADD_RECORD, tx(1))])
+        self.log.close()
+        with open(self.log.wal_path(0), "ab") as f:
+            f.write(RECORD_LENGTH.pack(100) + b'cut')
+
+        log = PoolLog(Path(self.directory.name))
+        self.assertEqual(log.load()[1], digest)
+        # the partial record is dropped before the next append
+        digest = log.append([(ADD_RECORD, tx(2))])
+        log.close()
+        self.assertEqual(PoolLog(Path(self.directory.name)).load()[1], digest)
+
+    def test_reset(self):
+        self.log.append([(ADD_RECORD, tx(1))])
+        digest = self.log.reset([tx(2), tx(3)])
+        self.assertEqual(self.log.load(), ({tx(2).hash.hex(): tx(2), tx(3).hash.hex(): tx(3)}, digest))
+        self.assertEqual(list(Path(self.directory.name).glob("wal-*.log")), [self.log.wal_path(1)])
+
+
+if __name__ == '__main__':
+    unittest.main()
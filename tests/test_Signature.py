@@ -0,0 +1,88 @@
+import unittest
+from Signature import *
+
+
+class TestSignature(unittest.TestCase):
+    def setUp(self):
+        self.private_key, self.public_key = generate_keys()
+        verify_cache.clear()
+        public_key_cache.clear()
+
+    def test_verify_cache(self):
+        message = b'GoodChain'
+        signature = sign(message, self.private_key)
+
+        self.assertTrue(verify(message, signature, self.public_key))
+        self.assertEqual(verify_cache.stats(), CacheStats(0, 1, 1))
+        self.assertTrue(verify(message, signature, self.public_key))
+        self.assertEqual(verify_cache.stats(), CacheStats(1, 1, 1))
+
+        # failed checks are not cached
+        self.assertFalse(verify(b'BadChain', signature, self.public_key))
+        self.assertFalse(verify(b'BadChain', signature, self.public_key))
+        self.assertEqual(verify_cache.stats(), CacheStats(1, 3, 1))
+
+    def test_verify_cache_is_bounded(self):
+        cache = VerifyCache(maxsize=2)
+        for key in (b'a', b'b', b'c'):
+            cache.add(key)
+        self.assertFalse(cache.lookup(b'a'))
+        self.assertTrue(cache.lookup(b'c'))
+        self.assertEqual(cache.stats().size, 2)
+
+    def test_public_key_cache(self):
+        encoded = encode_public_key(self.public_key)
+        decoded = decode_public_key(encoded)
+        self.assertIs(decode_public_key(encoded), decoded)
+        self.assertEqual(public_key_cache.stats(), CacheStats(1, 1, 1))
+
+        # interned keys encode back to the same bytes
+        self.assertIs(encode_public_key(decoded), encoded)
+        self.assertEqual(encode_public_key(self.public_key), encoded)
+
+    def test_address(self):
+        address = address_of(self.public_key)
+        self.assertEqual(len(address), ADDRESS_SIZE)
+        self.assertEqual(address_of(encode_public_key(self.public_key)), address)
+        self.assertIs(address_of(address), address)
+
+        # registered addresses resolve to the full key
+        self.assertEqual(encode_public_key(resolve_public_key(address)),
+                         encode_public_key(self.public_key))
+        message = b'GoodChain'
+        self.assertTrue(verify_by_address(message,
+                                          sign(message, self.private_key),
+                                          address))
+
+        # unknown addresses never verify
+        self.assertIsNone(resolve_public_key(bytes(ADDRESS_SIZE)))
+        self.assertFalse(verify_by_address(message,
+                                           sign(message, self.private_key),
+                                           bytes(ADDRESS_SIZE)))
+
+    def test_signature_schemes(self):
+        message = b'GoodChain'
+        rsa_private_key, rsa_public_key = generate_keys(RSA)
+        self.assertIs(scheme_of(self.public_key), SCHEMES[DEFAULT_SCHEME])
+
+        for private_key, public_key in ((self.private_key, self.public_key),
+                                        (rsa_private_key, rsa_public_key)):
+            signature = sign(message, private_key)
+            self.assertEqual(signature[0], scheme_of(public_key).tag)
+            self.assertTrue(verify(message, signature, public_key))
+            # keys keep their scheme through encoding
+            decoded = decode_public_key(encode_public_key(public_key))
+            self.assertIs(scheme_of(decoded), scheme_of(public_key))
+
+        # a signature only verifies with a key of its own scheme
+        self.assertFalse(verify(message, sign(message, self.private_key), rsa_public_key))
+        self.assertFalse(verify(message, bytes((RSA,)) + sign(message, self.private_key)[1:], self.public_key))
+
+        # untagged RSA signatures made before the scheme tag still verify
+        legacy = SCHEMES[RSA].sign(message, rsa_private_key)
+        self.assertTrue(verify(message, legacy, rsa_public_key))
+        self.assertEqual(len(sign(message, self.private_key)), 65)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,7 @@
 import unittest
-from Transaction import Tx, NORMAL, REWARD, REWARD_VALUE
-from Signature import generate_keys
+from Transaction import Tx, NORMAL, REWARD, REWARD_VALUE, TX_LAYOUT, to_units, from_units
+import pickle
+from Signature import generate_keys, encode_public_key, address_of, ADDRESS_SIZE, RSA
 
 
 class TestTx(unittest.TestCase):
@@ -58,6 +59,97 @@ class TestTx(unittest.TestCase):
         tx.sig = b'invalid signature'
         self.assertFalse(tx.is_valid())
 
+    def test_canonical_encoding(self):
+        tx = Tx(10.1, 10.0, 0.1, self.public_key, self.public_key)
+        tx.sign(self.private_key)
+        self.assertEqual(len(tx.encode()), TX_LAYOUT.size)
+
+        # the encoding does not depend on how the amount was computed
+        same = Tx(10.0 + 0.1, 10.0, 0.1, self.public_key, self.public_key)
+        same.created_at = tx.created_at
+        self.assertEqual(same.encode(), tx.encode())
+
+    def test_amounts_out_of_range(self):
+        # amounts that do not fit the encoding leave the tx unsigned instead of raising
+        tx = Tx(1e12, 1e12, 0.0, self.public_key, self.public_key)
+        tx.sign(self.private_key)
+        self.assertIsNone(tx.hash)
+        self.assertFalse(tx.is_valid())
+
+        # a received tx with such an amount is rejected
+        tx = Tx(10.1, 10.0, 0.1, self.public_key, self.public_key)
+        tx.sign(self.private_key)
+        tx.input, tx.output = 2**64, 2**64 - to_units(0.1)
+        self.assertFalse(tx.hash_is_valid())
+        self.assertFalse(tx.is_valid())
+        self.assertFalse(tx.valid_input_output())
+
+    def test_tampered_tx_is_rehashed(self):
+        tx = Tx(10.1, 10.0, 0.1, self.public_key, self.public_key)
+        tx.sign(self.private_key)
+        self.assertTrue(tx.hash_is_valid())
+        tx.output = to_units(10.1)
+        self.assertFalse(tx.hash_is_valid())
+        tx.output = to_units(10.0)
+        self.assertTrue(tx.is_valid())
+
+    def test_legacy_tx_keeps_hash(self):
+        tx = Tx(10.1, 10.0, 0.1, self.public_key, self.public_key)
+        tx.created_at = '01/02/2024 03:04:05.000006'
+        tx.sign(self.private_key)
+        self.assertTrue(tx.is_valid())
+        self.assertEqual(tx.get_created_at().year, 2024)
+
+        # legacy txs carrying full keys load with addresses
+        tx.sender = tx.receiver = encode_public_key(self.public_key)
+        loaded = pickle.loads(pickle.dumps(tx))
+        self.assertEqual(loaded.sender, address_of(self.public_key))
+        self.assertTrue(loaded.is_valid())
+
+    def test_amounts_are_base_units(self):
+        tx = Tx(0.3, 0.1 + 0.1, 0.1, self.public_key, self.public_key)
+        tx.sign(self.private_key)
+        self.assertEqual(tx.get_input(), 30000000)
+        self.assertEqual(from_units(tx.get_output()), 0.2)
+        self.assertTrue(tx.valid_input_output())
+        self.assertTrue(tx.is_valid())
+
+        # legacy txs carrying amounts in coins load as base units and keep their hash
+        tx = Tx(10, 9, 1, self.public_key, self.public_key)
+        tx.created_at = '01/02/2024 03:04:05.000006'
+        tx._Tx__legacy_amounts = ('10', '9', '1')
+        tx.sign(self.private_key)
+        state = tx.__getstate__()
+        state.update(input=10, output=9, fee=1)
+        del state['_Tx__legacy_amounts']
+        loaded = Tx.__new__(Tx)
+        loaded.__setstate__(state)
+        self.assertEqual(loaded.get_input(), to_units(10))
+        self.assertTrue(loaded.is_valid())
+        loaded.output = to_units(8)
+        self.assertFalse(loaded.is_valid())
+
+    def test_rsa_and_ed25519_senders(self):
+        # RSA and Ed25519 accounts are used side by side
+        rsa_private_key, rsa_public_key = generate_keys(RSA)
+        txs = [Tx(1.1, 1.0, 0.1, self.public_key, rsa_public_key),
+               Tx(1.1, 1.0, 0.1, rsa_public_key, self.public_key)]
+        txs[0].sign(self.private_key)
+        txs[1].sign(rsa_private_key)
+        self.assertTrue(all(tx.is_valid() for tx in txs))
+
+        # a tx signed with the key of the other scheme does not verify
+        txs[1].sign(self.private_key)
+        self.assertFalse(txs[1].is_valid())
+
+    def test_tx_uses_addresses(self):
+        tx = Tx(10.1, 10.0, 0.1, self.public_key, self.public_key)
+        tx.sign(self.private_key)
+        self.assertEqual(len(tx.sender), ADDRESS_SIZE)
+        self.assertTrue(tx.sent_by(address_of(self.public_key)))
+        self.assertTrue(tx.sent_by(encode_public_key(self.public_key)))
+        self.assertTrue(tx.signed_by(tx.sender))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,41 @@
+import unittest
+from time import sleep
+from User import User, KeySession
+from Signature import generate_keys, encode_keys, encode_public_key
+
+
+class TestUser(unittest.TestCase):
+    def setUp(self):
+        self.password = "testertester"
+        self.user = User("tester", self.password,
+                         encode_keys(generate_keys(), self.password))
+
+    def test_key_session(self):
+        session = KeySession(self.user)
+        self.assertIsNone(session.unlock("wrongpassword"))
+        self.assertFalse(session.is_unlocked())
+
+        keys = session.unlock(self.password)
+        self.assertEqual(encode_public_key(keys[1]), self.user.public_key)
+        # the decrypted keys are reused for the rest of the session
+        self.assertIs(session.unlock(self.password), keys)
+        self.assertIsNone(session.unlock("wrongpassword"))
+
+        session.close()
+        self.assertFalse(session.is_unlocked())
+        self.assertIsNone(session.expiry)
+        self.assertIsNot(session.unlock(self.password), keys)
+
+    def test_key_session_idle_timeout(self):
+        session = KeySession(self.user, idle_timeout=0.1)
+        keys = session.unlock(self.password)
+        self.assertTrue(session.is_unlocked())
+        sleep(0.2)
+        # the keys are dropped by the timer, without a call to notice the timeout
+        self.assertIsNone(session.keys)
+        self.assertFalse(session.is_unlocked())
+        self.assertIsNot(session.unlock(self.password), keys)
+
+
+if __name__ == '__main__':
+    unittest.main()